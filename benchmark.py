@@ -0,0 +1,635 @@
+#!/usr/bin/env python
+
+"""Benchmarks for the compressors used by build_ext_packages.py.
+
+usage: benchmark.py [options] <benchmark> [file.js ...]
+
+benchmarks:
+  jsmin   the included jsmin (reference) against fastjsmin
+  cssmin  bytes saved (raw and gzipped) and throughput of cssmin, whole
+          streamed and with merge
+  escape  ParseMaster escape/unescape round trip from 100KB to 20MB, the
+          time per MB should stay flat
+  unpack  raw and gzipped size of each compressor's output next to the time
+          Rhino (custom_rhino.jar) takes to parse, unpack and eval it
+  daemon  time per job of the java compressors run with java -jar, in the
+          daemon (a fresh class loader per job) and in a daemon keeping
+          one loader per jar, the last column is what loading costs
+  suite   jsmin, ParseMaster, JavaScriptPacker, process_jsb and the java
+          compressors on synthetic source trees of each of --sizes, with
+          throughput, scaling and an optional comparison to a --baseline
+
+usage: benchmark.py [options] corpus <dir>
+
+  writes a synthetic source tree of --size KB with its src/ext.jsb to <dir>
+
+Without files a synthetic ExtJS-like source (stylesheet for cssmin) of
+--size KB is used.
+"""
+
+import os
+import sys
+import gzip
+import math
+import time
+import shutil
+import tempfile
+from StringIO import StringIO
+from optparse import OptionParser, Values
+
+import build_ext_packages
+import fastjsmin
+import cssmin
+from jvmcompressor import run_jar, CompressorDaemon, DaemonError
+from minifycache import NoCache
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RHINO_JAR = os.path.join(HERE, "custom_rhino.jar")
+YUI_JAR = os.path.join(HERE, "yuicompressor-2.1.jar")
+
+# a component in the style of the ExtJS sources, repeated (with renamed
+# identifiers) to build synthetic input of any size
+SAMPLE = r"""/*
+ * Ext JS Library 2.0
+ * Copyright(c) 2006-2007, Ext JS, LLC.
+ */
+
+/**
+ * @class Ext.ux.Sample%(n)d
+ * @extends Ext.Panel
+ */
+Ext.ux.Sample%(n)d = Ext.extend(Ext.Panel, {
+    // private
+    baseCls : 'x-sample-%(n)d',
+    title : "Sample \"%(n)d\"",
+    autoHeight : true,
+
+    initComponent : function(){
+        Ext.ux.Sample%(n)d.superclass.initComponent.call(this);
+        this.addEvents('beforeload', 'load');
+        var re = /^\s+|\s+$/g, count = 0;
+        for(var i = 0, len = this.items.length; i < len; i++){
+            if(this.items[i] && !this.items[i].hidden){
+                count += i %% 2 == 0 ? 1 : -1;
+            }
+        }
+        this.total = count;
+    },
+
+    onRender : function(ct, position){
+        Ext.ux.Sample%(n)d.superclass.onRender.call(this, ct, position);
+        this.el.addClass(this.baseCls + '-body');
+        this.body.update('<div class="' + this.baseCls + '-text">' +
+            String.format('{0} of {1}', this.total, this.items.length) + '</div>');
+    }
+});
+Ext.reg('sample%(n)d', Ext.ux.Sample%(n)d);
+"""
+
+def synthetic_source(size):
+    """Returns about *size* bytes of ExtJS-like javascript."""
+    parts = []
+    total = 0
+    n = 0
+    while total < size:
+        part = SAMPLE % {'n': n}
+        parts.append(part)
+        total += len(part)
+        n += 1
+    return "".join(parts)
+
+# a rule set in the style of the ExtJS stylesheets, for synthetic CSS
+CSS_SAMPLE = """/*
+ * Sample %(n)d
+ */
+.x-sample-%(n)d {
+    background: #FFFFFF url(../images/default/sample/bg-%(n)d.gif) repeat-x 0px 0px;
+    border: 1px solid #99bbe8;
+    margin: 0px 0px 0px 0px;
+    padding: 0.5em 4px;
+}
+
+.x-sample-%(n)d .x-sample-header, .x-sample-%(n)d .x-sample-footer {
+    font: normal 11px tahoma, arial, helvetica, sans-serif;
+    color: #15428b;
+}
+
+.x-sample-%(n)d-unused {
+}
+
+html>/**/body .x-sample-%(n)d {
+    zoom: 1;
+}
+"""
+
+def synthetic_css(size):
+    """Returns about *size* bytes of ExtJS-like CSS."""
+    parts = []
+    total = 0
+    n = 0
+    while total < size:
+        part = CSS_SAMPLE % {'n': n}
+        parts.append(part)
+        total += len(part)
+        n += 1
+    return "".join(parts)
+
+# the synthetic tree has a directory of sources per package, with a
+# target for each plus ext-all.js including everything
+CORPUS_PACKAGES = ["core", "util", "data", "dd", "widgets", "grid", "form", "tree"]
+CORPUS_FILE_SIZE = 32 * 1024
+
+def write_corpus(root, size, file_size=CORPUS_FILE_SIZE):
+    """Writes about *size* bytes of ExtJS-like sources to *root*/src, in
+    files of about *file_size* bytes, and the src/ext.jsb building them."""
+    includes = []
+    total = 0
+    n = 0
+    while total < size or not includes:
+        package = CORPUS_PACKAGES[len(includes) % len(CORPUS_PACKAGES)]
+        parts = []
+        length = 0
+        while not parts or (length < file_size and total + length < size):
+            part = SAMPLE % {'n': n}
+            parts.append(part)
+            length += len(part)
+            n += 1
+        dirname = os.path.join(root, "src", package)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        name = "%s\\Sample%d.js" % (package, len(includes))
+        f = open(os.path.join(dirname, "Sample%d.js" % len(includes)), "wb")
+        f.write("".join(parts))
+        f.close()
+        includes.append(name)
+        total += length
+    jsb = ['<?xml version="1.0" encoding="utf-8"?>', '<project name="Synthetic" version="2.0">']
+    for package in CORPUS_PACKAGES:
+        files = [name for name in includes if name.startswith(package + "\\")]
+        if files:
+            jsb.append('  <target name="%s" file="$output\\%s\\%s.js" debug="True">' % (package, package, package))
+            jsb.extend(['    <include name="%s" />' % name for name in files])
+            jsb.append('  </target>')
+    jsb.append('  <target name="Everything" file="$output\\ext-all.js" debug="True">')
+    jsb.extend(['    <include name="%s" />' % name for name in includes])
+    jsb.append('  </target>')
+    jsb.append('</project>')
+    f = open(os.path.join(root, "src", "ext.jsb"), "w")
+    f.write("\n".join(jsb) + "\n")
+    f.close()
+    return total
+
+def timed(repeat, func, *args):
+    """Best wall time of *repeat* runs, and the result of the last one."""
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        result = func(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def mb_per_s(nbytes, seconds):
+    return nbytes / (1024.0 * 1024.0) / max(seconds, 1e-9)
+
+def repeated(data, size):
+    """*data* repeated up to *size* bytes."""
+    return (data * (size // max(len(data), 1) + 1))[:size]
+
+# input sizes in KB for the scaling benchmarks
+SCALING_SIZES = [100, 1000, 5000, 20000]
+
+def bench_jsmin(sources, options):
+    print "%-28s %9s %14s %14s %8s" % ("input", "size", "reference", "fastjsmin", "speedup")
+    for name, data in sources:
+        t_ref, ref = timed(options.repeat, build_ext_packages.jsmin, data)
+        t_new, new = timed(options.repeat, fastjsmin.jsmin, data)
+        print "%-28s %7dKB %9.2f MB/s %9.2f MB/s %7.1fx%s" % (
+            name[-28:], len(data) / 1024, mb_per_s(len(data), t_ref), mb_per_s(len(data), t_new),
+            t_ref / max(t_new, 1e-9), ref != new and "  OUTPUT DIFFERS" or "")
+
+def bench_cssmin(sources, options):
+    print "%-28s %9s %9s %7s %9s %9s %9s %14s %14s %14s" % (
+        "input", "size", "minified", "saved", "merged", "gzipped", "gz min", "whole", "streamed", "merge")
+    for name, data in sources:
+        t_whole, minified = timed(options.repeat, cssmin.cssmin, data)
+        t_stream, streamed = timed(options.repeat, lambda data: "".join(cssmin.cssmin_stream(StringIO(data))), data)
+        t_merge, merged = timed(options.repeat, lambda data: cssmin.cssmin(data, merge=True), data)
+        print "%-28s %7dKB %7dKB %6.1f%% %7dKB %7dKB %7dKB %9.2f MB/s %9.2f MB/s %9.2f MB/s%s%s" % (
+            name[-28:], len(data) / 1024, len(minified) / 1024,
+            100.0 * (len(data) - len(minified)) / max(len(data), 1), len(merged) / 1024,
+            gzip_size(data) / 1024, gzip_size(minified) / 1024,
+            mb_per_s(len(data), t_whole), mb_per_s(len(data), t_stream), mb_per_s(len(data), t_merge),
+            streamed != minified and "  STREAM DIFFERS" or "",
+            minified.count(">/**/") != data.count(">/**/") and "  HACK LOST" or "")
+
+def bench_escape(sources, options):
+    pm = build_ext_packages.ParseMaster()
+    def roundtrip(data):
+        string, escaped = pm._escape(data, '\\')
+        return pm._unescape(string, '\\', escaped)
+    print "%-28s %9s %10s %10s %10s" % ("input", "size", "time", "speed", "per MB")
+    for name, data in sources:
+        first = None
+        for size in SCALING_SIZES:
+            scaled = repeated(data, size * 1024)
+            t, result = timed(options.repeat, roundtrip, scaled)
+            per_mb = t / (len(scaled) / (1024.0 * 1024.0))
+            if first is None:
+                first = per_mb
+            print "%-28s %7dKB %9.3fs %5.1f MB/s %9.2fx%s" % (
+                name[-28:], size, t, mb_per_s(len(scaled), t), per_mb / max(first, 1e-9),
+                result != scaled and "  OUTPUT DIFFERS" or "")
+
+# run by the Rhino shell: <script> <packed|plain> <runs> [preload.js ...]
+# Prints "RESULT <parse> <unpack> <eval> <error>" with the best times in ms.
+UNPACK_HARNESS = r"""
+var Context = Packages.org.mozilla.javascript.Context;
+var global = this;
+function now() { return java.lang.System.nanoTime() / 1e6; }
+// just enough of a browser for library code to get going
+var window = global;
+var navigator = {userAgent: "rhino", appVersion: "", platform: ""};
+var document = {compatMode: "CSS1Compat", documentElement: {style: {}},
+    getElementsByTagName: function() { return []; },
+    getElementById: function() { return null; },
+    createElement: function() { return {style: {}}; }};
+
+var file = arguments[0], packed = arguments[1] == "packed", runs = parseInt(arguments[2], 10);
+for (var i = 3; i < arguments.length; i++) load(arguments[i]);
+var source = readFile(file, "UTF-8");
+var realEval = global.eval;
+var best = [Infinity, Infinity, Infinity], error = "";
+for (var run = 0; run < runs; run++) {
+    var cx = Context.getCurrentContext();
+    var times = [];
+    var t = now();
+    var script = cx.compileString(source, file, 1, null);
+    times.push(now() - t);
+    var unpacked = null;
+    if (packed) {
+        // the packed script ends in eval() of the unpacked source, take it
+        // from there to time unpacking alone
+        global.eval = function(code) { unpacked = String(code); };
+        t = now();
+        try { script.exec(cx, global); } catch (e) { error = String(e); }
+        times.push(now() - t);
+        global.eval = realEval;
+        t = now();
+        if (unpacked !== null) {
+            try { cx.compileString(unpacked, file, 1, null).exec(cx, global); } catch (e) { error = String(e); }
+        }
+        times.push(now() - t);
+    } else {
+        times.push(0);
+        t = now();
+        try { script.exec(cx, global); } catch (e) { error = String(e); }
+        times.push(now() - t);
+    }
+    for (var i = 0; i < 3; i++) best[i] = Math.min(best[i], times[i]);
+}
+print("RESULT " + best.join(" ") + " " + error.replace(/\s+/g, " "));
+"""
+
+def gzip_size(data):
+    buf = StringIO()
+    f = gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=9)
+    f.write(data)
+    f.close()
+    return len(buf.getvalue())
+
+def write_temp(data, suffix=".js"):
+    fd, fname = tempfile.mkstemp(suffix=suffix)
+    os.write(fd, data)
+    os.close(fd)
+    return fname
+
+def run_java_on(jar, args, data, options, to_file=False):
+    """Output of a java compressor for *data*, None when it failed. With
+    *to_file* it is written to a file given with -o (YUI Compressor)."""
+    fname = write_temp(data)
+    outfile = None
+    if to_file:
+        outfile = fname + ".min"
+        args = args + ["-o", outfile]
+    try:
+        retval, output = run_jar("java", jar, args + [fname], use_daemon=options.java_daemon,
+                                 outfile=outfile)
+    finally:
+        os.unlink(fname)
+        if outfile is not None and os.path.exists(outfile):
+            os.unlink(outfile)
+    return retval == 0 and output or None
+
+def rhino_times(data, packed, options):
+    """(parse, unpack, eval) times in ms of *data* in Rhino and the error it
+    raised, or None when Rhino did not report."""
+    harness = write_temp(UNPACK_HARNESS)
+    fname = write_temp(data)
+    try:
+        retval, output = run_jar("java", RHINO_JAR,
+            ["-opt", "-1", harness, fname, packed and "packed" or "plain", str(options.repeat)] + options.preload,
+            use_daemon=options.java_daemon)
+    finally:
+        os.unlink(harness)
+        os.unlink(fname)
+    for line in output.splitlines():
+        if line.startswith("RESULT "):
+            fields = line.split(" ", 4)
+            return [float(t) for t in fields[1:4]], fields[4:] and fields[4] or ""
+    return None
+
+def bench_unpack(sources, options):
+    compressors = {
+        'jsmin': fastjsmin.jsmin,
+        'shrinksafe': lambda data: run_java_on(RHINO_JAR, ["-opt", "-1", "-c"], data, options),
+        'yui': lambda data: run_java_on(YUI_JAR, ["--charset", "utf8"], data, options, True),
+        'jspacker': lambda data: build_ext_packages.JavaScriptPacker().pack(
+            data, compaction=False, encoding=62, fastDecode=True),
+    }
+    # single compressors, and the chains the builder runs (yui+jsmin is
+    # its default)
+    chains = [[], ['jsmin'], ['shrinksafe'], ['yui'], ['jspacker'], ['yui', 'jsmin'], ['jsmin', 'jspacker']]
+    for name, data in sources:
+        print name
+        print "%-16s %9s %9s %9s %9s %9s %9s  %s" % (
+            "compressor", "raw", "gzip", "parse", "unpack", "eval", "total", "")
+        outputs = {(): data}
+        for chain in chains:
+            output = data
+            for i, compressor in enumerate(chain):
+                key = tuple(chain[:i + 1])
+                if key not in outputs:
+                    outputs[key] = output is not None and compressors[compressor](output) or None
+                output = outputs[key]
+            label = "+".join(chain) or "none"
+            if output is None:
+                print "%-16s %s" % (label, "compressor failed")
+                continue
+            result = rhino_times(output, chain[-1:] == ['jspacker'], options)
+            if result is None:
+                times, note = "n/a", "no result from rhino"
+                total = "n/a"
+            else:
+                times, note = ["%7.1fms" % t for t in result[0]], result[1]
+                total = "%7.1fms" % sum(result[0])
+                if note:
+                    note = "eval failed: " + note
+            print "%-16s %7dKB %7dKB %9s %9s %9s %9s  %s" % ((label, len(output) / 1024, gzip_size(output) / 1024)
+                + tuple(isinstance(times, list) and times or [times] * 3) + (total, note))
+        print
+
+def daemon_job(daemon, jar, args, fname, outfile):
+    """Output of one run of *jar* on *fname* in *daemon*, or in a JVM of
+    its own when *daemon* is None; None when it failed."""
+    if outfile is not None:
+        args = args + ["-o", outfile]
+    if daemon is None:
+        retval, output = run_jar("java", jar, args + [fname], use_daemon=False, outfile=outfile)
+        return retval == 0 and output or None
+    try:
+        retval, output, err = daemon.run(jar, args + [fname])
+    except DaemonError:
+        return None
+    if retval != 0:
+        return None
+    if outfile is not None:
+        f = open(outfile, "rb")
+        try:
+            output = f.read()
+        finally:
+            f.close()
+    return output
+
+def bench_daemon(sources, options):
+    # each job gets a fresh class loader in the daemon (the compressors keep
+    # static state); against a daemon keeping one loader per jar this shows
+    # what that costs per job
+    jars = [("shrinksafe", RHINO_JAR, ["-opt", "-1", "-c"], False),
+            ("yui", YUI_JAR, ["--charset", "utf8"], True)]
+    daemons = []
+    try:
+        for reuse in (False, True):
+            daemon = CompressorDaemon(reuse_loaders=reuse)
+            daemons.append(daemon)
+            try:
+                daemon.start()
+            except DaemonError, e:
+                print >>sys.stderr, "cannot start the compressor daemon: %s" % e
+                return
+        print "%-28s %-10s %9s %11s %11s %11s %9s" % (
+            "input", "compressor", "size", "one-shot", "per job", "reused", "loading")
+        for name, data in sources:
+            fname = write_temp(data)
+            try:
+                for label, jar, args, to_file in jars:
+                    outfile = to_file and fname + ".min" or None
+                    runs = [timed(options.repeat, daemon_job, daemon, jar, args, fname, outfile)
+                            for daemon in [None] + daemons]
+                    outputs = [output for t, output in runs]
+                    note = ""
+                    if None in outputs:
+                        note = "  FAILED"
+                    elif outputs[1:] != outputs[:-1]:
+                        note = "  OUTPUT DIFFERS"
+                    print "%-28s %-10s %7dKB %9.1fms %9.1fms %9.1fms %7.1fms%s" % (
+                        name[-28:], label, len(data) / 1024, runs[0][0] * 1000, runs[1][0] * 1000,
+                        runs[2][0] * 1000, (runs[1][0] - runs[2][0]) * 1000, note)
+            finally:
+                os.unlink(fname)
+                if os.path.exists(fname + ".min"):
+                    os.unlink(fname + ".min")
+    finally:
+        for daemon in daemons:
+            daemon.stop()
+
+SUPERLINEAR = 1.2   # scaling exponent from one size to the next that is flagged
+REGRESSION = 1.2    # slowdown against the baseline that is flagged
+NOISE = 0.05        # seconds, shorter runs are not flagged
+BASELINE_VERSION = 1
+
+# the builder options process_jsb and compress_target read: nothing is
+# compressed, so the process_jsb stage times joining the sources
+BUILD_OPTIONS = {
+    "no_continue": False, "inline_images": 0, "auto": False,
+    "shrinksafe": False, "yui_compressor": False, "jsmin": False, "jspacker": False,
+    "jspacker_chunk_size": 0, "cssmin": False, "css_merge": False,
+}
+
+def suite_stages(options):
+    """(name, func) of the suite; func(root, fname, data) times one run on a
+    corpus in *root* whose sources are joined in *fname* and *data*, and
+    returns None when the stage could not run."""
+    def process_jsb(root, fname, data):
+        # from disk every time, not from the builder's in-memory caches
+        build_ext_packages._sources.clear()
+        build_ext_packages._jsb_targets.clear()
+        old_cwd, stdout = os.getcwd(), sys.stdout
+        os.chdir(root)
+        sys.stdout = StringIO()
+        try:
+            build_options = build_ext_packages.options
+            for output, files, sources in build_ext_packages.process_jsb("src/ext.jsb", "."):
+                # ext-all.js is only written by compress_target()
+                stages = build_ext_packages.target_stages(output, build_options)
+                if stages is not None:
+                    build_ext_packages.compress_target(output, sources, stages, build_options, NoCache())
+        finally:
+            sys.stdout = stdout
+            os.chdir(old_cwd)
+        return True
+    def java(jar, args, to_file=False):
+        def run(root, fname, data):
+            extra, outfile = [], None
+            if to_file:
+                outfile = os.path.join(root, "ext-all.min.js")
+                extra = ["-o", outfile]
+            retval, output = run_jar("java", jar, args + extra + [fname], use_daemon=options.java_daemon,
+                                     outfile=outfile)
+            return retval == 0 or None
+        return run
+    return [
+        ("jsmin", lambda root, fname, data: fastjsmin.jsmin(data)),
+        ("parsemaster", lambda root, fname, data: build_ext_packages.JavaScriptPacker().basicCompression(data)),
+        ("jspacker", lambda root, fname, data: build_ext_packages.JavaScriptPacker().pack(
+            data, compaction=False, encoding=62, fastDecode=True)),
+        ("process_jsb", process_jsb),
+        ("shrinksafe", java(RHINO_JAR, ["-opt", "-1", "-c"])),
+        ("yui", java(YUI_JAR, ["--charset", "utf8"], True)),
+    ]
+
+def run_suite(options):
+    """Returns {stage: {size in KB: best seconds or None}}."""
+    stages = suite_stages(options)
+    build = dict(stages)["process_jsb"]
+    if options.stages:
+        stages = [stage for stage in stages if stage[0] in options.stages.split(",")]
+    results = dict([(name, {}) for name, func in stages])
+    # process_jsb reads the module global of the builder
+    build_ext_packages.options = Values(BUILD_OPTIONS)
+    for kb in options.sizes:
+        root = tempfile.mkdtemp(prefix="extjs-bench-")
+        try:
+            write_corpus(root, kb * 1024)
+            # the other stages run on ext-all.js, all sources joined
+            build(root, None, None)
+            fname = os.path.join(root, "ext-all.js")
+            data = open(fname, "rb").read()
+            for name, func in stages:
+                t, result = timed(options.repeat, func, root, fname, data)
+                results[name][kb] = result is not None and t or None
+                print >>sys.stderr, "%s %dKB: %s" % (name, kb, result is not None and "%.3fs" % t or "n/a")
+        finally:
+            shutil.rmtree(root)
+    return results
+
+def report_suite(results, options, baseline=None):
+    for name, func in suite_stages(options):
+        if name not in results:
+            continue
+        times = results[name]
+        speeds = [mb_per_s(kb * 1024, times[kb]) for kb in options.sizes if times.get(kb)]
+        fastest = max(speeds or [1e-9])
+        print name
+        print "%10s %10s %11s %9s  %-20s %s" % ("size", "time", "speed", "scaling", "throughput", "")
+        prev = None
+        for kb in options.sizes:
+            t = times.get(kb)
+            if not t:
+                print "%8dKB %10s" % (kb, "n/a")
+                prev = None
+                continue
+            speed = mb_per_s(kb * 1024, t)
+            scaling = ""
+            notes = []
+            if prev is not None:
+                exponent = math.log(t / prev[1]) / math.log(float(kb) / prev[0])
+                scaling = "n^%.2f" % exponent
+                if exponent > SUPERLINEAR and t > NOISE:
+                    notes.append("SUPER-LINEAR")
+            if baseline is not None:
+                recorded = baseline.get(name, {}).get(str(kb))
+                if recorded:
+                    notes.append("%.2fx baseline" % (t / recorded))
+                    if t / recorded > REGRESSION and t > NOISE:
+                        notes.append("SLOWER")
+            print "%8dKB %9.3fs %6.1f MB/s %9s  %-20s %s" % (
+                kb, t, speed, scaling, "#" * int(round(20 * speed / fastest)), " ".join(notes))
+            prev = (kb, t)
+        print
+
+def bench_suite(sources, options):
+    baseline = None
+    if options.baseline:
+        f = open(options.baseline)
+        try:
+            data = json.load(f)
+        finally:
+            f.close()
+        if data.get("version") == BASELINE_VERSION:
+            baseline = data["results"]
+        else:
+            print >>sys.stderr, "ignoring baseline %s of another version" % options.baseline
+    results = run_suite(options)
+    report_suite(results, options, baseline)
+    if options.save_baseline:
+        f = open(options.save_baseline, "w")
+        try:
+            json.dump({"version": BASELINE_VERSION,
+                       "results": dict([(name, dict([(str(kb), t) for kb, t in times.items()]))
+                                        for name, times in results.items()])},
+                      f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+
+BENCHMARKS = {
+    'jsmin': bench_jsmin,
+    'cssmin': bench_cssmin,
+    'escape': bench_escape,
+    'unpack': bench_unpack,
+    'daemon': bench_daemon,
+    'suite': bench_suite,
+}
+
+if __name__=="__main__":
+    usage = "%prog [options] <" + "|".join(sorted(BENCHMARKS)) + "> [file.js|file.css ...]\n" \
+            "       %prog [options] corpus <dir>"
+    parser = OptionParser(usage=usage)
+    parser.add_option("-s", "--size", action="store", type="int", dest="size",
+                      default=512, help="Size in KB of the synthetic input [%default]")
+    parser.add_option("-r", "--repeat", action="store", type="int", dest="repeat",
+                      default=3, help="Runs per measurement, the best one counts [%default]")
+    parser.add_option("--preload", action="append", dest="preload", default=[],
+                      help="Script Rhino loads before timing (unpack), e.g. the ext-base adapter; "
+                      "can be given more than once")
+    parser.add_option("--no-java-daemon", action="store_false", dest="java_daemon",
+                      default=True, help="Start a new JVM for every java run")
+    parser.add_option("--sizes", action="store", type="string", dest="sizes",
+                      default="100,1000,5000", help="Corpus sizes in KB for the suite [%default]")
+    parser.add_option("--stages", action="store", type="string", dest="stages",
+                      help="Comma separated stages the suite runs [all]")
+    parser.add_option("--baseline", action="store", type="string", dest="baseline",
+                      help="Compare the suite against results saved with --save-baseline")
+    parser.add_option("--save-baseline", action="store", type="string", dest="save_baseline",
+                      help="Save the suite results to this file")
+    (options, args) = parser.parse_args()
+    options.sizes = [int(kb) for kb in options.sizes.split(",")]
+    # read by build_ext_packages.build_target()
+    options.no_continue = False
+    if args[:1] == ["corpus"] and len(args) == 2:
+        print "%d bytes written" % write_corpus(args[1], options.size * 1024)
+        sys.exit(0)
+    if not args or args[0] not in BENCHMARKS:
+        parser.print_help()
+        sys.exit(1)
+    if args[1:]:
+        sources = [(fname, open(fname).read()) for fname in args[1:]]
+    else:
+        synthetic = args[0] == "cssmin" and synthetic_css or synthetic_source
+        sources = [("synthetic", synthetic(options.size * 1024))]
+    BENCHMARKS[args[0]](sources, options)
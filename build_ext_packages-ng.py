@@ -19,6 +19,9 @@ __version__ = "0.3"
 import os, sys, shutil, tempfile
 from StringIO import StringIO
 from optparse import OptionParser
+import fastjsmin
+from jvmcompressor import run_jar
+from minifycache import MinifyCache, NoCache, DEFAULT_CACHE_DIR, compressor_id
 try:
     from cElementTree import ElementTree as ET
     cet = True
@@ -29,8 +32,17 @@ except ImportError:
     except ImportError:
 	print "ElementTree not found; u need ElementTree of cElementTree to run this script."
 	sys.exit(1)
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+try:
+    import json
+except ImportError:
+    import simplejson as json
 
 """ included jsmin, see http://www.crockford.com/javascript/jsmin.py.txt """
+# builds use fastjsmin, this one is kept as the reference for its output
 def jsmin(js):
     ins = StringIO(js)
     outs = StringIO()
@@ -212,90 +224,250 @@ class JavascriptMinify(object):
 
 class ProcessRhinoError(Exception): pass
 
-def process_rhino(fname):
+def process_rhino(fname, options):
     if not os.path.isfile(fname):
         raise Exception("Missing file: " % fname)
     if not fname.endswith(".js"):
         raise Exception("File is not javascript (.js) and cannot process with rhino: %s" % fname)
+    retval, data = run_jar("java", "custom_rhino.jar", ["-c", os.path.abspath(fname)],
+                           use_daemon=options.java_daemon)
+    if retval != 0:
+        print "executing chustom_rhino.jar with java failed..."
+        raise ProcessRhinoError("Executing chustom_rhino.jar with java failed.")
+    return data
+
+JSMIN_ID = "jsmin-" + __version__
+
+def process_file(inf, options, cache):
+    """Read one include file and run the enabled compressors over it,
+    reusing cached results. Returns None when ShrinkSafe failed on the file."""
+    data = open(inf).read()
+    if inf.endswith(".js"):
+        if options.shrinksafe:
+            def rhino(data):
+                try:
+                    return process_rhino(inf, options)
+                except ProcessRhinoError:
+                    return None
+            data = cache.minify(data, compressor_id("shrinksafe", "custom_rhino.jar"), ["-c"], rhino)
+            if data is None:
+                return None
+        if options.jsmin:
+            data = cache.minify(data, JSMIN_ID, [], fastjsmin.jsmin)
+    return data
+
+def _process_file_job(job):
+    # pool workers get a single argument, and hand their cache hits and
+    # misses back since their counters die with them
+    inf, options, cache = job
+    hits, misses = cache.hits, cache.misses
+    data = process_file(inf, options, cache)
+    return data, cache.hits - hits, cache.misses - misses
+
+def write_file(fname, write):
+    """Calls write(f) with a file that replaces *fname* once it returns."""
+    tmpname = fname + ".tmp"
+    f = open(tmpname, "w+b")
     try:
-	fd, tmpfile = tempfile.mkstemp()
-	os.close(fd)
-	retval = os.system("java -jar custom_rhino.jar -c %s > %s" % (fname, tmpfile))
-	if retval != 0:
-	    print "executing chustom_rhino.jar with java failed..."
-	    raise ProcessRhinoError("Executing chustom_rhino.jar with java failed.")
-	return open(tmpfile).read()
-    finally:
-	try:
-	    os.unlink(tmpfile)
-	except OSError:
-	    pass
+        try:
+            write(f)
+        finally:
+            f.close()
+    except:
+        os.unlink(tmpname)
+        raise
+    if os.path.exists(fname) and os.name == "nt":
+        os.unlink(fname)
+    os.rename(tmpname, fname)
+
+def split_bundles(sizes, budget):
+    """Cuts the sizes of the compressed includes of a target, in include
+    order, into runs that stay within *budget* bytes when joined by
+    newlines; an include larger than that is a run of its own. Returns the
+    runs as lists of indexes."""
+    bundles = []
+    size = 0
+    for i, n in enumerate(sizes):
+        if bundles and bundles[-1] and size + 1 + n <= budget:
+            bundles[-1].append(i)
+            size += 1 + n
+        else:
+            bundles.append([i])
+            size = n
+    return bundles
 
-def process_jsb(fname, output_dir, options):
+def bundle_names(output, count):
+    root, ext = os.path.splitext(output)
+    return ["%s-%d%s" % (root, i + 1, ext) for i in range(count)]
+
+def remove_bundles(output, keep=()):
+    """Removes the bundles of *output* a last build listed, but *keep*."""
+    root, ext = os.path.splitext(output)
+    listing = root + "-bundles.json"
+    if not os.path.isfile(listing):
+        return
+    try:
+        old = [bundle["file"] for bundle in json.load(open(listing))["bundles"]]
+    except (ValueError, KeyError, TypeError):
+        return
+    for name in old:
+        name = os.path.join(os.path.dirname(output), name)
+        if name not in keep and os.path.isfile(name):
+            os.unlink(name)
+    if not keep:
+        os.unlink(listing)
+        if os.path.isfile(root + "-bundles.html"):
+            os.unlink(root + "-bundles.html")
+
+def write_bundles(output, parts, budget):
+    """Writes the compressed includes *parts*, [(include, data)] in
+    include order, as <output>-1.js, <output>-2.js, ... of at most *budget*
+    bytes each, plus <output>-bundles.json and <output>-bundles.html listing
+    them in load order. The includes are joined as they are, nothing is
+    compressed again."""
+    root, ext = os.path.splitext(output)
+    runs = split_bundles([len(data) for inf, data in parts], budget)
+    names = bundle_names(output, len(runs))
+    bundles = []
+    for name, run in zip(names, runs):
+        data = '\n'.join([parts[i][1] for i in run])
+        write_file(name, lambda f: f.write(data))
+        if len(data) > budget:
+            print "....%s is over the budget, %s alone is %d bytes" % (name, parts[run[0]][0], len(data))
+        bundles.append({"file": os.path.basename(name), "size": len(data),
+                        "includes": [parts[i][0] for i in run]})
+    remove_bundles(output, names)
+    write_file(root + "-bundles.json", lambda f: json.dump({"target": os.path.basename(output), "budget": budget,
+                                             "bundles": bundles}, f, indent=1, sort_keys=True))
+    write_file(root + "-bundles.html", lambda f: f.writelines(
+        ['<script type="text/javascript" src="%s"></script>\n' % bundle["file"] for bundle in bundles]))
+    print "..split %s into %d bundles of at most %d bytes" % (output, len(bundles), budget)
+
+def process_jsb(fname, output_dir, options, cache, pool=None):
     print "Processing", fname
     rootdir = os.path.dirname(fname)
     jsb = cet and ET(file=fname) or ET.parse(fname)
     root = jsb.getroot()
-    for package in root.findall("target"):
+    targets = root.findall("target")
+    processed = {}
+    if pool is not None:
+        # compress every distinct include up front on the pool, the targets
+        # below are then joined from the results in .jsb order
+        infiles = []
+        for package in targets:
+            for file in package.findall("include"):
+                inf = os.path.join(rootdir, file.attrib['name']).replace('\\', '/')
+                if inf not in processed and os.path.isfile(inf):
+                    processed[inf] = None
+                    infiles.append(inf)
+        try:
+            # a timeout on get() keeps KeyboardInterrupt deliverable
+            results = pool.map_async(_process_file_job,
+                                     [(inf, options, cache) for inf in infiles]).get(0xFFFFFF)
+        except KeyboardInterrupt:
+            print "KeyboardInterrupt..."
+            pool.terminate()
+            raise
+        for inf, (data, hits, misses) in zip(infiles, results):
+            processed[inf] = data
+            cache.hits += hits
+            cache.misses += misses
+    for package in targets:
         output = os.path.normpath(package.attrib['file'].replace('$output', output_dir).replace('\\', '/'))
         dirname = os.path.dirname(output)
         print "..creating", output
         if dirname and not os.path.exists(dirname):
-	    os.makedirs(dirname)
-        files = [file.attrib['name'] for file in package.findall("include")]
-        filecontents = []
-	if output=="ext-all.js":
-	    debugcontents = []
-	for file in files:
-	    inf = os.path.join(rootdir, file).replace('\\', '/')
-	    if not os.path.isfile(inf):
-		print "missing file:", inf
-		if options.force or options.continue_building:
-		    continue
-		else:
-		    # exit with failure
-		    print "exiting..."
-		    sys.exit(1)
-	    if inf.endswith(".js"):		
-		if output=="ext-all.js":
-		    debugcontents.append(open(inf).read())
-		data = open(inf).read()
-		if options.shrinksafe:
-		    try:
-			result = process_rhino(inf)
-		    except KeyboardInterrupt:
-			print "KeyboardInterrupt..."
-			raise
-		    except ProcessRhinoError:
-			if options.force:
-			    data = result
-			    continue
-			sys.exit(1)
-		    else:
-			data = result
-		if options.jsmin:
-		    data = jsmin(data)
-		filecontents.append(data)
-	    else:
-		filecontents.append(open(inf).read())
-        all = '\n'.join(filecontents)
-	if options.jsmin:
-	    all = jsmin(all)
-        open(output, 'w+b').write(all)
-	if output=="ext-all.js":
-	    all = '\n'.join(debugcontents)
-	    open("ext-all-debug.js", "w+b").write(all)
+            os.makedirs(dirname)
+        infiles = []
+        for file in package.findall("include"):
+            inf = os.path.join(rootdir, file.attrib['name']).replace('\\', '/')
+            if not os.path.isfile(inf):
+                print "missing file:", inf
+                if options.force or options.continue_building:
+                    continue
+                else:
+                    # exit with failure
+                    print "exiting..."
+                    sys.exit(1)
+            infiles.append(inf)
+        def compressed():
+            # (include, compressed data) one at a time
+            for inf in infiles:
+                if inf in processed:
+                    data = processed[inf]
+                else:
+                    try:
+                        data = process_file(inf, options, cache)
+                    except KeyboardInterrupt:
+                        print "KeyboardInterrupt..."
+                        raise
+                    if options.split_budget:
+                        # kept for the bundles
+                        processed[inf] = data
+                if data is None:
+                    # ShrinkSafe failed on this file
+                    if options.force:
+                        continue
+                    sys.exit(1)
+                yield inf, data
+        def contents():
+            # the compressed includes joined by newlines
+            first = True
+            for inf, data in compressed():
+                if not first:
+                    yield '\n'
+                first = False
+                yield data
+        if options.jsmin:
+            # piped through the streaming jsmin straight into the output,
+            # the target is never held in memory as a whole
+            write_file(output, lambda f: fastjsmin.jsmin_file(contents(), f))
+        else:
+            write_file(output, lambda f: f.writelines(contents()))
+        if options.split_budget and output.endswith(".js") and os.path.getsize(output) > options.split_budget:
+            write_bundles(output, list(compressed()), options.split_budget)
+        elif options.split_budget:
+            # small enough now
+            remove_bundles(output)
+        if output=="ext-all.js":
+            def debug(f):
+                jsfiles = [inf for inf in infiles if inf.endswith(".js")]
+                for i, inf in enumerate(jsfiles):
+                    if i:
+                        f.write('\n')
+                    inf = open(inf, "rb")
+                    try:
+                        shutil.copyfileobj(inf, f)
+                    finally:
+                        inf.close()
+            write_file("ext-all-debug.js", debug)
     print
-    
+
 def main(ext_root, options):
+    if options.cache:
+        cache = MinifyCache(os.path.abspath(options.cache_dir))
+    else:
+        cache = NoCache()
+    pool = None
     old_cwd = os.getcwd()
     try:
-	os.chdir(ext_root)
-	process_jsb("src/ext.jsb", '.', options)
-	process_jsb("resources/resources.jsb", 'resources', options)
-	print "Done"
+        os.chdir(ext_root)
+        if options.jobs > 1:
+            if multiprocessing is None:
+                print "multiprocessing not found; building with a single job."
+            else:
+                # workers inherit the current directory, so start them here
+                pool = multiprocessing.Pool(options.jobs)
+        process_jsb("src/ext.jsb", '.', options, cache, pool)
+        process_jsb("resources/resources.jsb", 'resources', options, cache, pool)
+        if options.cache:
+            print cache.summary()
+        print "Done"
     finally:
-	os.chdir(old_cwd)
+        if pool is not None:
+            pool.close()
+            pool.join()
+        os.chdir(old_cwd)
 
 if __name__=="__main__":
 	usage = "%prog [options] <root_of_ext_svn_dir>"
@@ -310,6 +482,19 @@ if __name__=="__main__":
 						default=True, help="Use jsmin to minifie ext-all.js")
 	parser.add_option("-J", "--no-jsmin", action="store_false", dest="jsmin",
 						help="Disable jsmin")
+	parser.add_option("--no-java-daemon", action="store_false", dest="java_daemon",
+						default=True, help="Start a new JVM for every ShrinkSafe run")
+	parser.add_option("--jobs", action="store", type="int", dest="jobs",
+						default=1, help="Number of include files to compress in parallel")
+	parser.add_option("--split-budget", action="store", type="int", dest="split_budget",
+						default=0, help="Also write targets larger than this many bytes as "
+						"<target>-1.js, <target>-2.js, ... bundles of at most that size, made from "
+						"the compressed includes in order, listed in <target>-bundles.json and "
+						"-bundles.html [off]")
+	parser.add_option("--cache-dir", action="store", type="string", dest="cache_dir",
+						default=DEFAULT_CACHE_DIR, help="Directory of the minify cache [%default]")
+	parser.add_option("--no-cache", action="store_false", dest="cache",
+						default=True, help="Do not use the minify cache")
 	parser.add_option("-c", "--continue", action="store_true", dest="continue_building",
 						default=False, help="Continue building even if files do not exist.")
 	parser.add_option("-f", "--force", action="store_true", dest="force",
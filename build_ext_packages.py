@@ -48,11 +48,24 @@ DISABLE_PSYCO = 0
 import os
 import sys
 import stat
-import shutil
 import tempfile
 import re
+import time
+import threading
 from os.path import join as _j
 from optparse import OptionParser
+import fastjsmin
+import cssmin
+from jvmcompressor import run_jar_usage
+from minifycache import MinifyCache, NoCache, DEFAULT_CACHE_DIR, compressor_id
+from buildmanifest import BuildManifest
+from jsbwatch import make_watcher, wait_for_changes
+from buildstats import BuildStats
+from precompress import Precompressor, gzip_size
+from datauri import ImageInliner
+from pipeline import Pipeline, parse_stages, JS_STAGES, CSS_STAGES
+import jspackages
+import treeshake
 try:
     from StringIO import StringIO
 except ImportError:
@@ -277,6 +290,7 @@ def whichall(command, path=None, verbose=0, exts=None):
     return list( whichgen(command, path, verbose, exts) )
 
 """ included jsmin, see http://www.crockford.com/javascript/jsmin.py.txt """
+# builds use fastjsmin, this one is kept as the reference for its output
 def jsmin(js):
     ins = StringIO(js)
     outs = StringIO()
@@ -497,9 +511,9 @@ class ParseMaster:
     def __init__(self):
         # private
         self._patterns = Patterns()   # patterns stored by index
-        self._escaped = []
         self.ignoreCase = False
         self.escapeChar = None
+        self._compiled = None         # see _compile()
 
     def DELETE(self, match, offset):
         return "\x01" + match.group(offset) + "\x01"
@@ -536,22 +550,56 @@ class ParseMaster:
                 replacement = lambda a,o: self._repl(a,o,r,i)
         # pass the modified arguments
         self._patterns.append(Pattern(expression, replacement, length))
+        self._compiled = None
+
+    # compile the combined regex once, along with a table that maps the
+    # group number of each pattern (match.lastindex, since the group around
+    # a pattern closes last) to its replacement
+    def _compile(self):
+        if self._compiled is None or self._compiled[0] != self.ignoreCase:
+            if self.ignoreCase:
+                r = re.compile(str(self._patterns), re.I | re.M)
+            else:
+                r = re.compile(str(self._patterns), re.M)
+            table = {}
+            i = 1
+            for pattern in self._patterns:
+                if re.compile(pattern.expression).groups + 1 != pattern.length:
+                    # the counted groups are off (e.g. "(?:"), group
+                    # numbers do not line up; use the linear lookup
+                    table = None
+                    break
+                table[i] = (pattern.replacement, i)
+                i = i+pattern.length
+            self._compiled = (self.ignoreCase, r, table)
+        return self._compiled
 
     # execute the global replacement
     def execute(self, string):
-        if self.ignoreCase:
-            r = re.compile(str(self._patterns), re.I | re.M)
+        ignoreCase, r, table = self._compile()
+        # the escaped characters are kept per call, so that one
+        # ParseMaster can be used from several threads
+        string, escaped = self._escape(string, self.escapeChar)
+        if table is None:
+            string = r.sub(self._replacement, string)
         else:
-            r = re.compile(str(self._patterns), re.M)
-        string = self._escape(string, self.escapeChar)
-        string = r.sub(self._replacement, string)
-        string = self._unescape(string, self.escapeChar)
+            def replacement(match):
+                replacement, i = table[match.lastindex]
+                if callable(replacement):
+                    return replacement(match, i)
+                elif isinstance(replacement, (int, long)):
+                    return match.group(replacement+i)
+                else:
+                    return replacement
+            string = r.sub(replacement, string)
+        string = self._unescape(string, self.escapeChar, escaped)
         string = ParseMaster.DELETED.sub("", string)
         return string
 
     # clear the patterns collections so that this object may be re-used
     def reset(self):
         self._patterns = Patterns()
+        self._compiled = None
 
     # this is the global replace function (it's quite complicated)
     def _replacement(self, match):
@@ -569,32 +617,29 @@ class ParseMaster:
             else:
                 i = i+pattern.length
 
-    # encode escaped characters
+    # encode escaped characters, returns the string and the list of
+    # characters that followed the escapeChar
     def _escape(self, string, escapeChar=None):
-        def repl(match):
-            char = match.group(1)
-            self._escaped.append(char)
-            return escapeChar
         if escapeChar is None:
-            return string
+            return string, []
         r = re.compile("\\"+escapeChar+"(.)", re.M)
-        result = r.sub(repl, string)
-        return result
+        # split() alternates the text between escapes and the escaped chars
+        parts = r.split(string)
+        return escapeChar.join(parts[0::2]), parts[1::2]
 
-    # decode escaped characters
-    def _unescape(self, string, escapeChar=None):
-        def repl(match):
-            try:
-                #result = eval("'"+escapeChar + self._escaped.pop(0)+"'")
-                result = escapeChar + self._escaped.pop(0)
-                return result
-            except IndexError:
-                return escapeChar
+    # decode escaped characters: the n-th escapeChar gets the n-th escaped
+    # character back, those without one stay alone
+    def _unescape(self, string, escapeChar=None, escaped=()):
         if escapeChar is None:
             return string
-        r = re.compile("\\"+escapeChar, re.M)
-        result = r.sub(repl, string)
-        return result
+        parts = string.split(escapeChar)
+        n = len(parts) - 1
+        chars = [escapeChar + char for char in escaped[:n]]
+        chars.extend([escapeChar] * (n - len(chars)))
+        result = [None] * (2 * n + 1)
+        result[0::2] = parts
+        result[1::2] = chars
+        return "".join(result)
 
     def _internalEscape(self, string):
         return ParseMaster.ESCAPE.sub("", string)
@@ -609,6 +654,9 @@ class ParseMaster:
 ## http://dean.edwards.name/packer/
 
 class JavaScriptPacker:
+    # packed boot functions by (encoding, fastDecode, ascii)
+    _unpackers = {}
+
     def __init__(self):
         self._basicCompressionParseMaster = self.getCompressionParseMaster(False)
         self._specialCompressionParseMaster = self.getCompressionParseMaster(True)
@@ -723,74 +771,66 @@ class JavaScriptPacker:
             result.append(x)
         return "".join(result)
 
-    def encodeKeywords(self, script, encoding, fastDecode):
+    def encodeKeywords(self, script, encoding, fastDecode, chunkSize=0):
         # escape high-ascii values already in the script (i.e. in strings)
         if (encoding > 62):
             script = self.escape95(script)
-        # create the parser
-        parser = ParseMaster()
         encode = self.getEncoder(encoding)
         # for high-ascii, don't encode single character low-ascii
         if encoding > 62:
             regexp = r"""\w\w+"""
         else:
             regexp = r"""\w+"""
-        # build the word list
-        keywords = self.analyze(script, regexp, encode)
+        # build the word list, split() keeps the words at the odd indices
+        # so they can be encoded in place without a second scan
+        parts = re.compile("(" + regexp + ")", re.M).split(script)
+        words = parts[1::2]
+        keywords = self.analyze(script, regexp, encode, words)
         encoded = keywords['encoded']
-        # encode
-        def repl(match, offset):
-            return encoded.get(match.group(offset), "")
-        parser.add(regexp, repl)
+        # encode, dropping deleted sections like ParseMaster.execute()
+        parts[1::2] = map(encoded.__getitem__, words)
+        script = ParseMaster.DELETED.sub("", "".join(parts))
         # if encoded, wrap the script in a decoding function
-        script = parser.execute(script)
-        script = self.bootStrap(script, keywords, encoding, fastDecode)
+        script = self.bootStrap(script, keywords, encoding, fastDecode, chunkSize)
         return script
 
-    def analyze(self, script, regexp, encode):
+    def analyze(self, script, regexp, encode, words=None):
         # analyse
-        # retreive all words in the script
-        regexp = re.compile(regexp, re.M)
-        all = regexp.findall(script)
+        # retreive all words in the script, unless the caller already did
+        if words is None:
+            words = re.compile(regexp, re.M).findall(script)
         sorted = [] # list of words sorted by frequency
         encoded = {} # dictionary of word->encoding
         protected = {} # instances of "protected" words
-        if all:
-            unsorted = []
-            _protected = {}
-            values = {}
+        if words:
             count = {}
-            all.reverse()
-            for word in all:
-                word = "$"+word
-                if word not in count:
-                    count[word] = 0
-                    j = len(unsorted)
-                    unsorted.append(word)
-                    # make a dictionary of all of the protected words in this script
-                    #  these are words that might be mistaken for encoding
-                    values[j] = encode(j)
-                    _protected["$"+values[j]] = j
-                count[word] = count[word] + 1
-            # prepare to sort the word list, first we must protect
-            #  words that are also used as codes. we assign them a code
-            #  equivalent to the word itself.
+            for word in words:
+                count[word] = count.get(word, 0) + 1
+            # equally frequent words are ranked by their last occurrence,
+            #  the later the higher (dict() keeps the last index given)
+            last = dict(zip(words, xrange(len(words))))
+            values = [encode(i) for i in xrange(len(last))]
+            # protect words that are also used as codes. we assign them a
+            #  code equivalent to the word itself.
             # e.g. if "do" falls within our encoding range
             #      then we store keywords["do"] = "do";
             # this avoids problems when decoding
-            sorted = [None] * len(unsorted)
-            for word in unsorted:
-                if word in _protected and isinstance(_protected[word], int):
-                    sorted[_protected[word]] = word[1:]
-                    protected[_protected[word]] = True
-                    count[word] = 0
-            unsorted.sort(lambda a,b: count[b]-count[a])
+            codes = dict(zip(values, xrange(len(values))))
+            sorted = [None] * len(values)
+            ranked = []
+            for word in last:
+                if word in codes:
+                    sorted[codes[word]] = word
+                    protected[codes[word]] = True
+                else:
+                    ranked.append((-count[word], -last[word], word))
+            ranked.sort()
             j = 0
-            for i in range(len(sorted)):
+            for i in xrange(len(sorted)):
                 if sorted[i] is None:
-                    sorted[i]  = unsorted[j][1:]
+                    sorted[i] = ranked[j][2]
                     j = j + 1
-                encoded[sorted[i]] = values[i]
+            encoded = dict(zip(sorted, values))
         return {'sorted': sorted, 'encoded': encoded, 'protected': protected}
 
     def encodePrivate(self, charCode):
@@ -817,13 +857,15 @@ class JavaScriptPacker:
         return parser.execute(script)
 
     # build the boot function used for loading and decoding
-    def bootStrap(self, packed, keywords, encoding, fastDecode):
-        ENCODE = re.compile(r"""\$encode\(\$count\)""")
+    def bootStrap(self, packed, keywords, encoding, fastDecode, chunkSize=0):
         # $packed: the packed script
-        #packed = self.escape(packed)
-        #packed = [packed[x*10000:(x+1)*10000] for x in range((len(packed)/10000)+1)]
-        #packed = "'" + "'+\n'".join(packed) + "'\n"
-        packed = "'" + self.escape(packed) + "'"
+        if chunkSize:
+            # an array of string literals of chunkSize characters each,
+            #  joined again when the script is loaded
+            packed = [self.escape(packed[x:x+chunkSize]) for x in range(0, len(packed), chunkSize)] or [""]
+            packed = "['" + "',\n'".join(packed) + "'].join('')"
+        else:
+            packed = "'" + self.escape(packed) + "'"
 
         # $count: number of words contained in the script
         count = len(keywords['sorted'])
@@ -837,6 +879,30 @@ class JavaScriptPacker:
         # convert from a string to an array
         keywords = "'" + "|".join(keywords['sorted']) + "'.split('|')"
 
+        # special case: when $count==0 there ar no keywords. i want to keep
+        #  the basic shape of the unpacking funcion so i'll frig the code...
+        if fastDecode and not count:
+            raise NotImplemented
+            #) $decode = $decode.replace(/(\$count)\s*=\s*1/, "$1=0");
+
+        # the boot function only depends on these, build and pack it once
+        key = (encoding, fastDecode, ascii)
+        if key not in JavaScriptPacker._unpackers:
+            JavaScriptPacker._unpackers[key] = self.getUnpacker(encoding, fastDecode, ascii)
+        unpack = JavaScriptPacker._unpackers[key]
+
+        # arguments
+        params = [packed, str(ascii), str(count), keywords]
+        if fastDecode:
+            # insert placeholders for the decoder
+            params.extend(['0', "{}"])
+
+        # the whole thing
+        return "eval(" + unpack + "(" + ",".join(params) + "))\n";
+
+    # build the packed boot function
+    def getUnpacker(self, encoding, fastDecode, ascii):
+        ENCODE = re.compile(r"""\$encode\(\$count\)""")
         encoding_functions = {
             10: """ function($charCode) {
                         return $charCode;
@@ -883,12 +949,6 @@ class JavaScriptPacker:
                 # perform the encoding inline for lower ascii values
                 if ascii < 36:
                     decode = ENCODE.sub(inline, decode)
-            # special case: when $count==0 there ar no keywords. i want to keep
-            #  the basic shape of the unpacking funcion so i'll frig the code...
-            if not count:
-                raise NotImplemented
-                #) $decode = $decode.replace(/(\$count)\s*=\s*1/, "$1=0");
-
 
         # boot function
         unpack = r"""function($packed, $ascii, $count, $keywords, $encode, $decode) {
@@ -913,18 +973,9 @@ class JavaScriptPacker:
             # perform the encoding inline
             unpack = ENCODE.sub(inline, unpack)
         # pack the boot function too
-        unpack = self.pack(unpack, 0, False, True)
-
-        # arguments
-        params = [packed, str(ascii), str(count), keywords]
-        if fastDecode:
-            # insert placeholders for the decoder
-            params.extend(['0', "{}"])
-
-        # the whole thing
-        return "eval(" + unpack + "(" + ",".join(params) + "))\n";
+        return self.pack(unpack, 0, False, True)
 
-    def pack(self, script, encoding=0, fastDecode=False, specialChars=False, compaction=True):
+    def pack(self, script, encoding=0, fastDecode=False, specialChars=False, compaction=True, chunkSize=0):
         script = script+"\n"
         self._encoding = encoding
         self._fastDecode = fastDecode
@@ -935,7 +986,7 @@ class JavaScriptPacker:
             if compaction:
                 script = self.basicCompression(script)
         if encoding:
-            script = self.encodeKeywords(script, encoding, fastDecode)
+            script = self.encodeKeywords(script, encoding, fastDecode, chunkSize)
         return script
 """ end of jspacker """
 
@@ -943,6 +994,26 @@ try:
 	JAVA_BIN = which("java")
 except WhichError:
 	JAVA_BIN = None
+try:
+    JAVAC_BIN = which("javac")
+except WhichError:
+    JAVAC_BIN = None
+
+def run_java_compressor(jar, args, options, quiet=False, deadline=None, input=None, daemon_name=None,
+                        outfile=None):
+    """Run one of the compressor jars with *input* as its stdin, returns
+    (retval, output): its stdout, or what it wrote to *outfile*. Goes
+    through the persistent compressor daemon *daemon_name* unless
+    --no-java-daemon was given; file arguments must be absolute paths. A
+    run taking longer than --java-timeout seconds or not done by
+    *deadline* is killed and fails."""
+    retval, output, usage = run_jar_usage(JAVA_BIN, jar, args, JAVAC_BIN or "javac",
+                                          options.java_daemon, options.java_timeout or None,
+                                          input, deadline, daemon_name, outfile)
+    stats.add_child(usage)
+    if not quiet:
+        print "[%s]" % usage,
+    return retval, output
 
 def found_on_classpath(jar):
     for path in os.environ.get("CLASSPATH", "").split(";"):
@@ -950,90 +1021,760 @@ def found_on_classpath(jar):
             return True
     return False
 
-def process_jsb(fname, output_dir):
-    print "Processing", fname
+_jsb_targets = {}   # .jsb file -> (mtime, output_dir, targets)
+_sources = {}       # include file -> ((mtime, size), contents)
+stats = BuildStats() # timings of the stages of the current build
+_inliner = ImageInliner()
+_images = {}        # CSS target -> {image referenced: whether it was inlined}
+_compress = {}      # target -> compressor stages from its compress attribute
+
+def read_jsb(fname, output_dir):
+    """Returns the targets of a .jsb file as (output, [include paths]).
+    The file is only parsed again when it changed."""
+    mtime = os.stat(fname).st_mtime
+    if fname in _jsb_targets and _jsb_targets[fname][:2] == (mtime, output_dir):
+        return _jsb_targets[fname][2]
+    stage = stats.start("parse_jsb", fname, os.path.getsize(fname))
     rootdir = os.path.dirname(fname)
     jsb = ET(file=fname)
     root = jsb.getroot()
+    targets = []
     for package in root.findall("target"):
         output = os.path.normpath(package.attrib['file'].replace('$output', output_dir).replace('\\', '/'))
-        print "..creating", output
-        dirname = os.path.dirname(output)
-        if dirname and not os.path.exists(dirname): os.makedirs(dirname)
-        files = [file.attrib['name'] for file in package.findall("include")]
-        p = lambda file: _j(rootdir, file).replace('\\', '/')
-        if options.no_continue:
-            all = '\n'.join([open(p(file)).read() for file in files])
+        files = [_j(rootdir, file.attrib['name']).replace('\\', '/') for file in package.findall("include")]
+        targets.append((output, files))
+        if "compress" in package.attrib:
+            try:
+                _compress[output] = parse_stages(package.attrib["compress"],
+                                                 is_css(output) and CSS_STAGES or JS_STAGES)
+            except ValueError, e:
+                raise ValueError("%s, target %s: %s" % (fname, output, e))
         else:
-            all = '\n'.join([open(p(file)).read() for file in files if os.path.isfile(p(file))])
-        open(output, 'w').write(all)
+            _compress.pop(output, None)
+    stage.finish()
+    _jsb_targets[fname] = (mtime, output_dir, targets)
+    return targets
+
+def read_source(fname):
+    """Returns the contents of an include file, read once as long as it
+    does not change; ext-all.js shares its includes with the other targets."""
+    fname = os.path.normpath(fname)
+    st = os.stat(fname)
+    stamp = (st.st_mtime, st.st_size)
+    if fname not in _sources or _sources[fname][0] != stamp:
+        stage = stats.start("read", fname, st.st_size)
+        f = open(fname)
+        try:
+            _sources[fname] = (stamp, f.read())
+        finally:
+            f.close()
+        stage.finish(len(_sources[fname][1]))
+    return _sources[fname][1]
+
+def build_target(output, files):
+    """Joins the *files* into *output*, or, when it is compressed later,
+    into debug_name(output). Returns their contents, for compress_target()."""
+    print "..creating", output
+    dirname = os.path.dirname(output)
+    if dirname and not os.path.exists(dirname): os.makedirs(dirname)
+    if not options.no_continue:
+        files = [file for file in files if os.path.isfile(file)]
+    sources = [read_source(file) for file in files]
+    _images.pop(output, None)
+    if is_css(output) and options.inline_images:
+        sources = inline_images(output, files, sources)
+    size = sum([len(data) for data in sources])
+    fname = output
+    if target_stages(output, options) is not None:
+        fname = debug_name(output)
+    stage = stats.start("write", fname, size)
+    f = open(fname, 'w')
+    try:
+        for i, data in enumerate(sources):
+            if i:
+                f.write('\n')
+            f.write(data)
+    finally:
+        f.close()
+    stage.finish(size + max(len(sources) - 1, 0))
+    return sources
+
+def inline_images(output, files, sources):
+    """Inlines the small images the *sources* of a CSS target reference,
+    each resolved against the directory of its file; those referenced more
+    than once in the target are left alone."""
+    _inliner.max_size = options.inline_images
+    images = {}
+    size = sum([len(data) for data in sources])
+    stage = stats.start("inline", output, size)
+    counts = {}
+    for fname, data in zip(files, sources):
+        _inliner.count(data, os.path.dirname(fname), counts)
+    shared = set([image for image, n in counts.items() if n > 1])
+    inlined = []
+    added = 0
+    for fname, data in zip(files, sources):
+        data, n = _inliner.inline(data, os.path.dirname(fname), images, shared)
+        inlined.append(data)
+        added += n
+    stage.finish(size + added)
+    _images[output] = images
+    saved = len([fname for fname in images if images[fname]])
+    print "..inlined %d images into %s, %d requests saved, %d bytes added, %d shared images left alone" % (
+        saved, output, saved, added, len(shared))
+    stats.info.setdefault("inline_images", {})[output] = {"requests_saved": saved, "bytes_added": added,
+                                                          "shared": len(shared)}
+    return inlined
+
+def process_jsb(fname, output_dir, needs_build=None, on_built=None):
+    """Builds the targets of a .jsb file, or only those for which
+    needs_build(output, files) is true, calling on_built(output) after
+    each. Returns the targets built as (output, files, contents of the
+    files)."""
+    print "Processing", fname
+    built = []
+    for output, files in read_jsb(fname, output_dir):
+        if needs_build is None or needs_build(output, files):
+            sources = build_target(output, files)
+            built.append((output, files, sources))
+            if on_built is not None:
+                on_built(output)
     print
+    return built
+
+JSMIN_ID = "jsmin-" + __version__
+JSPACKER_ID = "jspacker-" + __version__
+CSSMIN_ID = "cssmin-" + __version__
+MANIFEST_FILE = ".build-manifest.json"
+PACKAGES_DIR = "packages"
+PACKAGES_LOADER = PACKAGES_DIR + "/" + jspackages.LOADER_NAME
+CLASS_INDEX_FILE = ".build-class-index.json"
+REPORT_FILE = ".build-report.json"
+
+def is_css(output):
+    return output.endswith(".css")
+
+def debug_name(output):
+    """Where the uncompressed target is kept, ext-all-debug.js for
+    ext-all.js and ext-all-debug.css for ext-all.css."""
+    root, ext = os.path.splitext(output)
+    return root + "-debug" + ext
+
+def target_stages(output, options):
+    """The compressor stages of a target (see pipeline), None when it is
+    not compressed: those of the compress attribute of its .jsb target,
+    otherwise the ones the options turn on for ext-all.js and the CSS
+    targets."""
+    if output in _compress:
+        return _compress[output]
+    if output == "ext-all.js":
+        return [name for name in ("shrinksafe", "yui_compressor", "jsmin", "jspacker")
+                if getattr(options, name, False)]
+    if is_css(output) and getattr(options, "cssmin", False):
+        return ["cssmin"]
+    return None
+
+def target_outputs(output, options):
+    if target_stages(output, options) is not None:
+        return [output, debug_name(output)]
+    return [output]
+
+def target_settings(output, options):
+    """Returns the options and the toolchain a target's build depends on."""
+    settings = {"no_continue": options.no_continue}
+    toolchain = {"builder": __version__}
+    stages = _compress.get(output)
+    if stages is not None:
+        settings["compress"] = stages
+        settings["jspacker_chunk_size"] = options.jspacker_chunk_size
+        if "shrinksafe" in stages:
+            toolchain["shrinksafe"] = compressor_id("shrinksafe", "custom_rhino.jar")
+        if "yui_compressor" in stages:
+            toolchain["yui_compressor"] = compressor_id("yui-compressor", "yuicompressor-2.1.jar")
+    if output == "ext-all.js":
+        for name in ("shrinksafe", "yui_compressor", "jsmin", "jspacker", "jspacker_chunk_size",
+                     "auto", "auto_budget"):
+            settings[name] = getattr(options, name)
+        if options.shrinksafe or options.auto and JAVA_BIN:
+            toolchain["shrinksafe"] = compressor_id("shrinksafe", "custom_rhino.jar")
+        if options.yui_compressor or options.auto and JAVA_BIN:
+            toolchain["yui_compressor"] = compressor_id("yui-compressor", "yuicompressor-2.1.jar")
+    elif is_css(output):
+        settings["cssmin"] = options.cssmin
+        settings["css_merge"] = options.css_merge
+        settings["inline_images"] = options.inline_images
+    elif output == PACKAGES_LOADER:
+        settings["jsmin"] = options.jsmin
+    elif output == options.app_output:
+        settings["jsmin"] = options.jsmin
+        settings["app"] = options.app
+    return settings, toolchain
+
+def minify_stage(name, cache, data, compressor, args, func, target="ext-all.js"):
+    """cache.minify() of *target*, recorded as stage *name*."""
+    hits = cache.thread_hits()
+    stage = stats.start(name, target, len(data))
+    try:
+        result = cache.minify(data, compressor, args, func)
+    except:
+        stage.finish(ok=False)
+        raise
+    stage.finish(result is not None and len(result) or 0, result is not None, cache.thread_hits() > hits)
+    return result
+
+STAGE_TITLES = {
+    "shrinksafe": "ShrinkSafe",
+    "yui_compressor": "YUI Compressor",
+    "jsmin": "jsmin",
+    "jspacker": "jspacker",
+    "cssmin": "cssmin",
+}
+
+def compressor_stages(output, options, cache, source=None, deadline=None, quiet=False,
+                      concurrent=False):
+    """The compressor stages for *output*, as name -> func(data) (see
+    pipeline), each going through the minify cache. The java ones only
+    read files: they are given the file of *source*, (file, data), when
+    their input is that data, and a temporary file otherwise. YUI
+    Compressor also writes its output to a file, a temporary one read back.
+    They are killed at *deadline*. When *concurrent*, each java stage gets
+    a JVM of its own, so that they can run at the same time."""
+    css = is_css(output)
+    suffix = os.path.splitext(output)[1]
+    def daemon_name(name):
+        return concurrent and name or None
+    def input_file(data):
+        # the file to run a jar on, and the temporary one to remove after
+        if source is not None and data is source[1]:
+            return os.path.abspath(source[0]), None
+        fd, tmpname = tempfile.mkstemp(suffix=suffix)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        return tmpname, tmpname
+    def shrinksafe(data):
+        fname, tmpname = input_file(data)
+        try:
+            retval, output = run_java_compressor("custom_rhino.jar", ["-opt", "-1", "-c", fname],
+                                                 options, quiet, deadline, None, daemon_name("shrinksafe"))
+        finally:
+            if tmpname is not None:
+                os.unlink(tmpname)
+        return retval == 0 and output or None
+    # the same arguments key the cache and run the jar
+    yui_args = ["--charset", "utf8", "--type", css and "css" or "js"]
+    def yui_compressor(data):
+        fname, tmpname = input_file(data)
+        fd, outname = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            retval, output = run_java_compressor("yuicompressor-2.1.jar", yui_args + ["-o", outname, fname],
+                                                 options, quiet, deadline, None,
+                                                 daemon_name("yui_compressor"), outname)
+        finally:
+            os.unlink(outname)
+            if tmpname is not None:
+                os.unlink(tmpname)
+        return retval == 0 and output or None
+    packer_args = ["compaction=False", "encoding=62", "fastDecode=True"]
+    if options.jspacker_chunk_size:
+        packer_args.append("chunkSize=%d" % options.jspacker_chunk_size)
+    def jspacker(data):
+        return JavaScriptPacker().pack(data, compaction=False, encoding=62, fastDecode=True,
+                                       chunkSize=options.jspacker_chunk_size)
+    cssmin_args = options.css_merge and ["merge"] or []
+    def css_minify(data):
+        return cssmin.cssmin(data, options.css_merge)
+    return {
+        "shrinksafe": lambda data: minify_stage("shrinksafe", cache, data,
+            compressor_id("shrinksafe", "custom_rhino.jar"), ["-opt", "-1", "-c"], shrinksafe, output),
+        "yui_compressor": lambda data: minify_stage("yui_compressor", cache, data,
+            compressor_id("yui-compressor", "yuicompressor-2.1.jar"), yui_args, yui_compressor, output),
+        "jsmin": lambda data: minify_stage("jsmin", cache, data, JSMIN_ID, [], fastjsmin.jsmin, output),
+        "jspacker": lambda data: minify_stage("jspacker", cache, data, JSPACKER_ID, packer_args,
+                                              jspacker, output),
+        "cssmin": lambda data: minify_stage("cssmin", cache, data, CSSMIN_ID, cssmin_args,
+                                            css_minify, output),
+    }
+
+def compress_target(output, sources, stages, options, cache, on_built=None):
+    """Runs the compressor *stages* over the *sources* build_target()
+    wrote to debug_name(output), for which on_built(output) is called. The
+    stages pass the data on in memory and *output* is written once, at the
+    end; a single jsmin or cssmin stage streams it there instead (see
+    stream_target()). Returns False when one of them failed; its input
+    went on to the next stage then."""
+    debug = debug_name(output)
+    if on_built is not None:
+        on_built(debug)
+    if output == "ext-all.js" and options.auto:
+        return auto_compress(options, cache, "\n".join(sources))
+    if len(stages) == 1 and stages[0] in STREAMING and not (stages[0] == "cssmin" and options.css_merge):
+        return stream_target(output, sources, stages[0], cache)
+    data = "\n".join(sources)
+    funcs = compressor_stages(output, options, cache, (debug, data))
+    def before(name):
+        print "Minifying %s using %s:" % (output, STAGE_TITLES[name]),
+        sys.stdout.flush()
+    def after(name, error):
+        if error is None:
+            print "done."
+        else:
+            print "error in %s: %s" % (name, error)
+    data, failed = Pipeline([(name, funcs[name]) for name in stages], before, after).run(data)
+    if failed:
+        print "..Couldn't create the compressed %s, left out %s" % (output, ", ".join(failed))
+    stage = stats.start("write", output, len(data))
+    write_file(output, data)
+    stage.finish(len(data))
+    return not failed
+
+# stages that can stream a target on their own: compressor id, func(chunks, outfile)
+STREAMING = {
+    "jsmin": (JSMIN_ID, fastjsmin.jsmin_file),
+    "cssmin": (CSSMIN_ID, cssmin.cssmin_file),
+}
+
+def stream_target(output, sources, name, cache):
+    """Runs the STREAMING stage *name* over the *sources* of *output*,
+    from them into the file without joining them or holding the output in
+    memory. Returns False when it failed; *output* holds the sources then."""
+    compressor, func = STREAMING[name]
+    chunks = []
+    for i, data in enumerate(sources):
+        if i:
+            chunks.append("\n")
+        chunks.append(data)
+    size = sum([len(chunk) for chunk in chunks])
+    print "Minifying %s using %s:" % (output, STAGE_TITLES[name]),
+    sys.stdout.flush()
+    hits = cache.thread_hits()
+    stage = stats.start(name, output, size)
+    try:
+        cache.minify_chunks(chunks, output, compressor, [], func)
+    except Exception, e:
+        stage.finish(ok=False)
+        print "error in %s: %s" % (name, e)
+        print "..Couldn't create the compressed %s, left out %s" % (output, name)
+        f = open(output, "wb")
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+        finally:
+            f.close()
+        return False
+    stage.finish(os.path.getsize(output), True, cache.thread_hits() > hits)
+    print "done."
+    return True
+
+def write_file(fname, data):
+    f = open(fname, "wb")
+    try:
+        f.write(data)
+    finally:
+        f.close()
+
+def ext_all_includes(options):
+    """The include list of ext-all.js, for the targets made from it."""
+    jsb, output_dir = JSB_FILES[0]
+    files = dict(read_jsb(jsb, output_dir))["ext-all.js"]
+    if not options.no_continue:
+        files = [file for file in files if os.path.isfile(file)]
+    return files
+
+def needs_rebuild(manifest, output, files, outputs, options):
+    """needs_build() of build() for the targets that are not in a .jsb
+    file; *outputs* are the files the last build made."""
+    settings, toolchain = target_settings(output, options)
+    if options.incremental:
+        reasons = manifest.check(output, files, settings, toolchain, outputs)
+    else:
+        reasons = ["incremental build disabled"]
+    if not reasons:
+        print "..%s is up to date" % output
+        return False
+    if options.dry_run:
+        print "..would rebuild %s: %s" % (output, ", ".join(reasons))
+        return False
+    return True
+
+def build_packages(options, cache, manifest, on_built=None):
+    """Splits the includes of ext-all.js into the on-demand packages of
+    jspackages, written to packages/<name>-debug.js and, minified with
+    jsmin, packages/<name>.js, next to the loader and its manifest.
+    on_built(output) is called for each file. Returns whether anything was
+    built."""
+    jsb = JSB_FILES[0][0]
+    files = ext_all_includes(options)
+    settings, toolchain = target_settings(PACKAGES_LOADER, options)
+    entry = manifest.targets.get(PACKAGES_LOADER)
+    old_outputs = entry and sorted(entry["outputs"]) or [PACKAGES_LOADER]
+    if not needs_rebuild(manifest, PACKAGES_LOADER, files, old_outputs, options):
+        return False
+    print "Splitting ext-all.js into packages"
+    sources = [read_source(file) for file in files]
+    source_of = dict(zip(files, sources))
+    stage = stats.start("packages", PACKAGES_LOADER, sum([len(data) for data in sources]))
+    packages = jspackages.split_packages(files, sources, os.path.dirname(jsb))
+    stage.finish()
+    if not os.path.isdir(PACKAGES_DIR):
+        os.makedirs(PACKAGES_DIR)
+    outputs = []
+    info = {}
+    for package in packages:
+        data = "\n".join([source_of[file] for file in package.files])
+        debug = _j(PACKAGES_DIR, package.name + "-debug.js")
+        output = _j(PACKAGES_DIR, package.name + ".js")
+        write_file(debug, data)
+        if options.jsmin:
+            data = minify_stage("jsmin", cache, data, JSMIN_ID, [], fastjsmin.jsmin, output)
+        write_file(output, data)
+        outputs.extend([output, debug])
+        info[package.name] = {"files": len(package.files), "bytes": len(data), "requires": package.requires,
+                              "uses": package.uses}
+        print "..%s: %d files, %dKB, requires %s, uses %s" % (output, len(package.files), len(data) / 1024,
+                                                               ", ".join(package.requires) or "nothing",
+                                                               ", ".join(package.uses) or "nothing")
+    write_file(PACKAGES_LOADER, jspackages.loader_script(packages))
+    write_file(_j(PACKAGES_DIR, jspackages.MANIFEST_NAME),
+               jspackages.manifest_json(packages))
+    outputs.extend([PACKAGES_LOADER, _j(PACKAGES_DIR, jspackages.MANIFEST_NAME)])
+    for fname in old_outputs:
+        # packages that are gone, or were joined with others
+        if fname not in outputs and os.path.isfile(fname):
+            os.unlink(fname)
+    stats.info["packages"] = info
+    manifest.record(PACKAGES_LOADER, files, settings, toolchain, outputs)
+    if on_built is not None:
+        for fname in outputs:
+            on_built(fname)
+    return True
+
+_class_index = None
+
+def build_custom(options, cache, manifest, on_built=None):
+    """Builds options.app_output, the part of ext-all.js the application
+    files of options.app use, and its -debug version; see treeshake. The
+    class index of the sources is kept in CLASS_INDEX_FILE. on_built(output)
+    is called for both. Returns whether they were built."""
+    global _class_index
+    output = options.app_output
+    debug = debug_name(output)
+    files = ext_all_includes(options)
+    app = treeshake.app_files(options.app)
+    settings, toolchain = target_settings(output, options)
+    if not needs_rebuild(manifest, output, files + app, [output, debug], options):
+        return False
+    print "Building %s for %s" % (output, ", ".join(options.app))
+    if _class_index is None:
+        _class_index = treeshake.ClassIndex(CLASS_INDEX_FILE)
+    scanned = _class_index.scanned
+    stage = stats.start("shake", output)
+    needed = treeshake.shake(files, _class_index, app)
+    stage.finish()
+    _class_index.save()
+    if _class_index.scanned > scanned:
+        print "..indexed %d files" % (_class_index.scanned - scanned)
+    data = "\n".join([read_source(file) for file in needed])
+    total = sum([len(read_source(file)) for file in files]) + max(len(files) - 1, 0)
+    dirname = os.path.dirname(output)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    write_file(debug, data)
+    print "..%s: %d of %d files, %dKB of %dKB" % (debug, len(needed), len(files), len(data) / 1024, total / 1024)
+    if options.jsmin:
+        data = minify_stage("jsmin", cache, data, JSMIN_ID, [], fastjsmin.jsmin, output)
+    write_file(output, data)
+    stats.info["custom"] = {"output": output, "files": needed, "bytes": len(data)}
+    manifest.record(output, files + app, settings, toolchain, [output, debug])
+    if on_built is not None:
+        on_built(debug)
+        on_built(output)
+    return True
+
+def auto_compress(options, cache, data):
+    """--auto: tries every combination of the compressors on *data*, what
+    is in ext-all-debug.js, and writes the one that gzips smallest to ext-all.js.
+    Combinations share their common first passes and run concurrently, a
+    pass starting as soon as the one before it is done. With --auto-budget
+    the combinations not done by then are left out. Returns False when
+    none of them worked."""
+    print "Choosing the compressors for ext-all.js:"
+    sys.stdout.flush()
+    deadline = options.auto_budget and time.time() + options.auto_budget
+    results = {(): data}
+    passes = compressor_stages("ext-all.js", options, cache, ("ext-all-debug.js", results[()]),
+                               deadline, quiet=True, concurrent=True)
+    bases = [()]
+    if JAVA_BIN:
+        bases.extend([("shrinksafe",), ("yui_compressor",)])
+    following = {}  # pipeline -> the pipelines adding one pass to it
+    for base in bases:
+        for with_jsmin in ((), ("jsmin",)):
+            for with_jspacker in ((), ("jspacker",)):
+                pipeline = base + with_jsmin + with_jspacker
+                if pipeline:
+                    following.setdefault(pipeline[:-1], []).append(pipeline)
+    times = {(): 0.0}
+    errors = {}
+    threads = []
+    lock = threading.Lock()
+    def expired():
+        return deadline and time.time() >= deadline
+    def start(pipelines):
+        if expired():
+            return
+        for pipeline in pipelines:
+            thread = threading.Thread(target=run, args=(pipeline,))
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+    def run(pipeline):
+        started = time.time()
+        try:
+            data = passes[pipeline[-1]](results[pipeline[:-1]])
+        except Exception, e:
+            data = e
+        lock.acquire()
+        try:
+            # a pass done after the deadline is left out like the running ones
+            if expired():
+                return
+            if isinstance(data, Exception):
+                errors[pipeline] = data
+            elif data is not None:
+                times[pipeline] = times[pipeline[:-1]] + time.time() - started
+                results[pipeline] = data
+                start(following.get(pipeline, []))
+        finally:
+            lock.release()
+    lock.acquire()
+    try:
+        start(following[()])
+    finally:
+        lock.release()
+    while 1:
+        # a thread starts the ones following it before it ends
+        lock.acquire()
+        try:
+            alive = [thread for thread in threads if thread.isAlive()]
+            if not alive or expired():
+                # what is in by now is all that counts, the threads still
+                # running neither add to it nor start more passes
+                finished = dict(results)
+                failed = dict(errors)
+                break
+        finally:
+            lock.release()
+        if deadline:
+            alive[0].join(max(deadline - time.time(), 0))
+        else:
+            alive[0].join()
+    if alive:
+        print "..time budget used up, leaving out the combinations still running"
+    done = [(gzip_size(data), len(data), times[pipeline], pipeline)
+            for pipeline, data in finished.items() if pipeline]
+    done.sort()
+    candidates = []
+    for gzsize, size, wall, pipeline in done:
+        name = "+".join(pipeline)
+        print "..%s: %d bytes, %d gzipped (%.2fs)" % (name, size, gzsize, wall)
+        candidates.append({"pipeline": name, "size": size, "gzip_size": gzsize, "wall": wall})
+    for pipeline, e in sorted(failed.items()):
+        print "..%s: error in %s: %s" % ("+".join(pipeline), pipeline[-1], e)
+    if not done:
+        print "..Couldn't create the compressed ext-all.js"
+        write_file("ext-all.js", data)
+        return False
+    winner = done[0][3]
+    stats.info["auto"] = {"target": "ext-all.js", "winner": "+".join(winner), "candidates": candidates}
+    print "..using %s" % "+".join(winner)
+    write_file("ext-all.js", finished[winner])
+    return True
+
+JSB_FILES = [("src/ext.jsb", '.'), ("resources/resources.jsb", 'resources')]
+
+def build(options, cache, manifest, only=None):
+    """One pass over the .jsb files, rebuilding the targets that changed
+    since the last build recorded in *manifest*. *only* restricts the pass
+    to a set of outputs. Returns the targets built."""
+    stats.reset()
+    def needs_build(output, files):
+        if only is not None and output not in only:
+            return False
+        settings, toolchain = target_settings(output, options)
+        if options.incremental:
+            reasons = manifest.check(output, files, settings, toolchain, target_outputs(output, options))
+        else:
+            reasons = ["incremental build disabled"]
+        if options.dry_run:
+            if reasons:
+                print "..would rebuild %s: %s" % (output, ", ".join(reasons))
+            else:
+                print "..%s is up to date" % output
+            return False
+        if not reasons:
+            print "..%s is up to date" % output
+        return bool(reasons)
+    gz = None
+    if options.gzip and not options.dry_run:
+        gz = Precompressor(manifest.gzipped, options.gzip_workers)
+    def precompress(output):
+        if gz is not None:
+            gz.submit(output)
+    def target_built(output):
+        # the compressed targets are not final before they are compressed
+        if target_stages(output, options) is None:
+            precompress(output)
+    built = []
+    sources = {}
+    for fname, output_dir in JSB_FILES:
+        for output, files, data in process_jsb(fname, output_dir, needs_build, target_built):
+            built.append((output, files))
+            sources[output] = data
+    if options.dry_run:
+        if options.packages and (only is None or "ext-all.js" in only):
+            build_packages(options, cache, manifest)
+        if options.app and (only is None or "ext-all.js" in only or options.app_output in only):
+            build_custom(options, cache, manifest)
+        return built
+    for output, files in built:
+        stages = target_stages(output, options)
+        if stages is not None:
+            ok = compress_target(output, sources.pop(output), stages, options, cache, precompress)
+            precompress(output)
+            if not ok:
+                # leave it out of the manifest, so the next run retries
+                continue
+        settings, toolchain = target_settings(output, options)
+        manifest.record(output, files, settings, toolchain, target_outputs(output, options),
+                        sorted(_images.get(output, {})))
+    if options.packages and (only is None or "ext-all.js" in only):
+        if build_packages(options, cache, manifest, precompress):
+            built.append((PACKAGES_LOADER, manifest.targets[PACKAGES_LOADER]["includes"]))
+    if options.app and (only is None or "ext-all.js" in only or options.app_output in only):
+        if build_custom(options, cache, manifest, precompress):
+            built.append((options.app_output, manifest.targets[options.app_output]["includes"]))
+    if gz is not None:
+        # outputs built before .gz files were asked for, or whose .gz is gone
+        done = dict(built)
+        for fname, output_dir in JSB_FILES:
+            for output, files in read_jsb(fname, output_dir):
+                if output in done:
+                    continue
+                for path in target_outputs(output, options):
+                    if os.path.isfile(path) and gz.needed(path):
+                        gz.submit(path)
+        for output in [options.packages and PACKAGES_LOADER, options.app and options.app_output]:
+            if output and output not in done and output in manifest.targets:
+                for path in manifest.targets[output]["outputs"]:
+                    if os.path.isfile(path) and gz.needed(path):
+                        gz.submit(path)
+        gz.join()
+        for fname, wall, size, gzsize in gz.results:
+            stats.add("gzip", fname, wall, size, gzsize or 0, gzsize is None)
+        for fname, e in gz.errors:
+            print "..could not write %s.gz: %s" % (fname, e)
+    manifest.save()
+    report = options.report
+    if report is None:
+        report = REPORT_FILE
+    if report:
+        stats.write(report, builder=__version__, options=vars(options),
+                    targets=[output for output, files in built])
+    stats.dump_profiles()
+    if options.timings:
+        print stats.summary()
+    return built
+
+def watch(options, cache, manifest):
+    """Rebuilds the targets including a file whenever it changes, until
+    interrupted. Parsed .jsb files, include contents and compressor results
+    stay in memory between rebuilds."""
+    def dependencies(output):
+        # the images of a CSS target, from the last build that made it;
+        # the manifest has them as unicode, which inotify cannot take
+        entry = manifest.targets.get(output)
+        encoding = sys.getfilesystemencoding() or "utf-8"
+        return [fname.encode(encoding) for fname in entry and entry.get("dependencies", {}) or ()]
+    def watched_files():
+        paths = []
+        for fname, output_dir in JSB_FILES:
+            paths.append(fname)
+            for output, files in read_jsb(fname, output_dir):
+                paths.extend(files)
+                paths.extend(dependencies(output))
+        paths.extend(treeshake.app_files(options.app))
+        return paths
+    watcher = make_watcher(watched_files())
+    print "Watching for changes (%s), press Ctrl-C to stop." % watcher.__class__.__name__
+    try:
+        try:
+            while 1:
+                changed = wait_for_changes(watcher)
+                manifest.forget(changed)
+                for fname in changed:
+                    _sources.pop(fname, None)
+                only = set()
+                for fname, output_dir in JSB_FILES:
+                    for output, files in read_jsb(fname, output_dir):
+                        if fname in changed or changed.intersection([os.path.normpath(f) for f in files]) \
+                                or changed.intersection(dependencies(output)):
+                            only.add(output)
+                if changed.intersection([os.path.normpath(f) for f in treeshake.app_files(options.app)]):
+                    only.add(options.app_output)
+                if not only:
+                    continue
+                print "Changed:", ", ".join(sorted(changed))
+                try:
+                    build(options, cache, manifest, only)
+                except Exception, e:
+                    print "Buiding Failed:", e
+                else:
+                    print "Buiding Completed"
+                watcher.set_paths(watched_files())
+        except KeyboardInterrupt:
+            print
+    finally:
+        watcher.close()
 
 def main(ext_root, options):
     if not os.path.isfile(_j(ext_root, "src", "ext.jsb")):
         print "Target directory is not a ExtJS svn checkout directory"
         sys.exit(1)
+    if options.cache:
+        cache = MinifyCache(os.path.abspath(options.cache_dir))
+    else:
+        cache = NoCache()
+    if options.report:
+        # given relative to where we were started, not to ext_root
+        options.report = os.path.abspath(options.report)
+    options.app = [os.path.abspath(path) for path in options.app]
+    for path in options.app:
+        if not os.path.exists(path):
+            print "Application path %s does not exist" % path
+            sys.exit(1)
+    if options.profile:
+        stats.profile_dir = os.path.abspath(options.profile)
+    stats.trace_memory = options.trace_memory
     old_cwd = os.getcwd()
     try:
         try:
             os.chdir(ext_root)
-            process_jsb("src/ext.jsb", '.')
-            process_jsb("resources/resources.jsb", 'resources')
-	    shutil.copy("ext-all.js", "ext-all-debug.js")
-            if options.shrinksafe:
-                print "Minifying ext-all.js using ShrinkSafe:",
-                sys.stdout.flush()
-                retval = os.system("%s -jar custom_rhino.jar -opt -1 -c ext-all-debug.js > ext-all.js" % JAVA_BIN)
-                if retval != 0:
-                    print "..Couldn't create the compressed ext-all.js"
-                    shutil.copy("ext-all-debug.js", "ext-all.js")
-                else:
-                    print "done."
-            if options.yui_compressor:
-                print "Minifying ext-all.js using YUI Compressor:",
-                sys.stdout.flush()
-                retval = os.system("%s -jar yuicompressor-2.1.jar --charset utf8 -o ext-all.js ext-all-debug.js" % JAVA_BIN)
-                if retval != 0:
-                    print "..Couldn't create the compressed ext-all.js"
-                    shutil.copy("ext-all-debug.js", "ext-all.js")
-                else:
-                    print "done."
-            if options.jsmin:
-                print "Minifying ext-all.js using jsmin:",
-                sys.stdout.flush()
-                try:
-                    f = open("ext-all.js")
-                    data = f.read()
-                    f.close()
-                    f = open("ext-all.js", "wb")
-                    f.write(jsmin(data))
-                    f.close()
-                except Exception, e:
-                    print "error in jsmin:", e
-                    open("ext-all.js", "wb").write(data)
-                else:
-                    print "done."
-            if options.jspacker:
-                print "Minifying ext-all.js using jspacker:",
-                sys.stdout.flush()
-                try:
-                    p = JavaScriptPacker()
-                    f = open("ext-all.js")
-                    data = f.read()
-                    f.close()
-                    f = open("ext-all.js", "wb")
-                    f.write(p.pack(data, compaction=False, encoding=62, fastDecode=True))
-                    f.close()
-                except Exception, e:
-                    print "error in jspacker:", e
-                    open("ext-all.js", "wb").write(data)
-                else:
-                    print "done."                
+            manifest = BuildManifest(MANIFEST_FILE)
+            build(options, cache, manifest)
+            if options.dry_run:
+                return
         except Exception, e:
             print "Buiding Failed"
             raise Exception(e)
         else:
+            if options.cache:
+                print cache.summary()
             print "Buiding Completed"
+        if options.watch:
+            watch(options, cache, manifest)
     finally:
         os.chdir(old_cwd)
 
@@ -1058,6 +1799,72 @@ if __name__=="__main__":
     					default=False, help="Use jspacker to minifie ext-all.js")
     parser.add_option("-P", "--no-jspacker", action="store_false", dest="jspacker",
     					help="Disable jspacker")
+    parser.add_option("--no-cssmin", action="store_false", dest="cssmin",
+                      default=True, help="Do not minify the CSS targets (ext-all.css); when they are, "
+                      "the unminified CSS is kept as <name>-debug.css")
+    parser.add_option("--css-merge", action="store_true", dest="css_merge",
+                      default=False, help="Also merge adjacent CSS rules with the same selector or "
+                      "the same declarations and drop overridden declarations")
+    parser.add_option("--inline-images", action="store", type="int", dest="inline_images",
+                      default=0, help="Inline the images of at most this many bytes the CSS targets "
+                      "refer to as data: URIs, saving a request each; IE before 8 does not show "
+                      "those [off]")
+    parser.add_option("--packages", action="store_true", dest="packages",
+                      default=False, help="Also split ext-all.js into packages by source directory, "
+                      "with what each requires worked out from the sources, minified to packages/ "
+                      "with a loader script (packages/packages.js) fetching them on demand")
+    parser.add_option("--app", action="append", dest="app", metavar="PATH",
+                      default=[], help="Also build a subset of ext-all.js with only what the "
+                      "application JavaScript in PATH (a file or a directory) uses, may be given "
+                      "more than once")
+    parser.add_option("--app-output", action="store", type="string", dest="app_output",
+                      default="ext-custom.js", help="File the --app subset is written to, "
+                      "relative to the ExtJS directory [%default]")
+    parser.add_option("-a", "--auto", action="store_true", dest="auto",
+                      default=False, help="Ignore the compressor options above, try every combination "
+                      "of them on ext-all.js and keep the one that is smallest gzipped")
+    parser.add_option("--auto-budget", action="store", type="float", dest="auto_budget",
+                      default=0, help="Seconds --auto may spend, combinations not done by then "
+                      "are left out [no limit]")
+    parser.add_option("--jspacker-chunk-size", action="store", type="int", dest="jspacker_chunk_size",
+                      default=0, help="Emit the jspacker payload as string literals of this many "
+                      "characters, for browsers that are slow on huge literals [off]")
+    parser.add_option("--no-java-daemon", action="store_false", dest="java_daemon",
+                      default=True, help="Start a new JVM for every java compressor run instead of "
+                      "keeping one compressor daemon running")
+    parser.add_option("--java-timeout", action="store", type="int", dest="java_timeout",
+                      default=600, help="Kill a java compressor still running after this many "
+                      "seconds and keep the uncompressed ext-all.js, 0 waits forever [%default]")
+    parser.add_option("-z", "--gzip", action="store_true", dest="gzip",
+                      default=False, help="Write a gzipped copy <output>.gz next to every output, "
+                      "for servers sending precompressed files")
+    parser.add_option("--gzip-workers", action="store", type="int", dest="gzip_workers",
+                      default=2, help="Threads writing the .gz files while the build goes on [%default]")
+    parser.add_option("--cache-dir", action="store", type="string", dest="cache_dir",
+                      default=DEFAULT_CACHE_DIR, help="Directory of the minify cache [%default]")
+    parser.add_option("--no-cache", action="store_false", dest="cache",
+                      default=True, help="Do not use the minify cache")
+    parser.add_option("--no-incremental", action="store_false", dest="incremental",
+                      default=True, help="Rebuild every target, even those that did not change "
+                      "since the last build")
+    parser.add_option("--report", action="store", type="string", dest="report",
+                      default=None, help="Write the per-stage timings of every build as JSON to "
+                      "this file [<root_of_ext_svn_dir>/%s]" % REPORT_FILE)
+    parser.add_option("--no-report", action="store_const", const="", dest="report",
+                      help="Do not write the timing report")
+    parser.add_option("--timings", action="store_true", dest="timings",
+                      default=False, help="Print a summary of the time spent in each stage")
+    parser.add_option("--profile", action="store", type="string", dest="profile",
+                      default=None, help="Run every stage under cProfile and write one pstats "
+                      "file per stage to this directory")
+    parser.add_option("--trace-memory", action="store_true", dest="trace_memory",
+                      default=False, help="Record the peak memory of every stage, with tracemalloc "
+                      "when it is installed")
+    parser.add_option("-n", "--dry-run", action="store_true", dest="dry_run",
+                      default=False, help="Only show which targets would be rebuilt and why")
+    parser.add_option("-w", "--watch", action="store_true", dest="watch",
+                      default=False, help="Keep running and rebuild the targets that include a "
+                      "file whenever it changes")
     parser.add_option("-C", "--no-continue", action="store_true", dest="no_continue",
     					default=False, help="Do not continue building if file(s) do not exist.")
     parser.add_option("-f", "--force", action="store_true", dest="force",
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""Build manifest for incremental builds.
+
+For every target the manifest records its include list, the state
+(mtime, size, sha1) of each include, of the other files the build read
+(images inlined into CSS) and of each output file it produced, and the
+options and toolchain it was built with. check() compares a
+target against the last recorded build and returns the reasons it needs
+rebuilding; an empty list means it is up to date. It also remembers which
+content the precompressed .gz copy of each output was made from.
+
+Files whose mtime and size did not change are not read again; a file that
+was only touched is hashed and found unchanged.
+"""
+
+import os
+try:
+    import json
+except ImportError:
+    import simplejson as json
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+MANIFEST_VERSION = 1
+
+def file_state(fname):
+    """Returns [mtime, size, sha1] of a file, None when it does not exist."""
+    try:
+        st = os.stat(fname)
+        f = open(fname, "rb")
+    except (IOError, OSError):
+        return None
+    try:
+        h = sha1()
+        while 1:
+            block = f.read(1 << 16)
+            if not block:
+                break
+            h.update(block)
+    finally:
+        f.close()
+    return [st.st_mtime, st.st_size, h.hexdigest()]
+
+class BuildManifest(object):
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.targets = {}
+        self.gzipped = {}   # output -> sha1 of the content its .gz was made from
+        self._states = {}
+        try:
+            f = open(fname)
+        except IOError:
+            return
+        try:
+            try:
+                data = json.load(f)
+            except ValueError:
+                # a broken manifest just means a full build
+                return
+        finally:
+            f.close()
+        if data.get("version") == MANIFEST_VERSION:
+            self.targets = data.get("targets", {})
+            self.gzipped = data.get("gzipped", {})
+
+    def state(self, fname, recorded=None):
+        """State of *fname* for this run. Skips hashing when mtime and size
+        still match the *recorded* state."""
+        if fname in self._states:
+            return self._states[fname]
+        try:
+            st = os.stat(fname)
+        except OSError:
+            state = None
+        else:
+            if recorded and recorded[0] == st.st_mtime and recorded[1] == st.st_size:
+                state = list(recorded)
+            else:
+                state = file_state(fname)
+        self._states[fname] = state
+        return state
+
+    def forget(self, fnames):
+        """Drop the states of *fnames* seen so far, they changed on disk."""
+        for fname in fnames:
+            self._states.pop(fname, None)
+
+    def _changed(self, fname, recorded):
+        state = self.state(fname, recorded)
+        if state is None or recorded is None:
+            return state != recorded
+        return state[2] != recorded[2]
+
+    def check(self, target, includes, options, toolchain, outputs):
+        """Returns the reasons *target* has to be rebuilt."""
+        entry = self.targets.get(target)
+        if entry is None:
+            return ["not built before"]
+        reasons = []
+        if entry["includes"] != includes:
+            reasons.append("include list changed")
+        else:
+            for fname in includes:
+                recorded = entry["inputs"].get(fname)
+                if self._changed(fname, recorded):
+                    if recorded is None:
+                        reasons.append("%s was added" % fname)
+                    elif self.state(fname) is None:
+                        reasons.append("%s was removed" % fname)
+                    else:
+                        reasons.append("%s changed" % fname)
+        for fname, recorded in sorted(entry.get("dependencies", {}).items()):
+            if self._changed(fname, recorded):
+                reasons.append("%s changed" % fname)
+        for name in sorted(set(options) | set(entry["options"])):
+            if options.get(name) != entry["options"].get(name):
+                reasons.append("option %s changed" % name)
+        for name in sorted(set(toolchain) | set(entry["toolchain"])):
+            if toolchain.get(name) != entry["toolchain"].get(name):
+                reasons.append("toolchain %s changed" % name)
+        for fname in outputs:
+            recorded = entry["outputs"].get(fname)
+            if recorded is None or self._changed(fname, recorded):
+                if self.state(fname, recorded) is None:
+                    reasons.append("output %s is missing" % fname)
+                else:
+                    reasons.append("output %s was modified" % fname)
+        return reasons
+
+    def record(self, target, includes, options, toolchain, outputs, dependencies=()):
+        """Record a successful build of *target*, which also read the files
+        in *dependencies*. Output files are hashed again since the build
+        just rewrote them."""
+        for fname in outputs:
+            self._states.pop(fname, None)
+        self.targets[target] = {
+            "includes": includes,
+            "inputs": dict([(fname, self.state(fname)) for fname in includes]),
+            "dependencies": dict([(fname, self.state(fname)) for fname in dependencies]),
+            "options": options,
+            "toolchain": toolchain,
+            "outputs": dict([(fname, self.state(fname)) for fname in outputs]),
+        }
+
+    def save(self):
+        tmpname = self.fname + ".tmp"
+        f = open(tmpname, "w")
+        try:
+            json.dump({"version": MANIFEST_VERSION, "targets": self.targets, "gzipped": self.gzipped},
+                      f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+        if os.path.exists(self.fname) and os.name == "nt":
+            os.unlink(self.fname)
+        os.rename(tmpname, self.fname)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+
+"""Per-stage timings of a build.
+
+Every stage of the pipeline (parsing a .jsb file, reading an include, a
+compressor pass, writing an output) is recorded with its wall time, CPU
+time and the bytes it took in and gave out. The records are written as a
+JSON report, so build cost can be tracked over time, and summed up per
+stage for people.
+
+On request the stages are also profiled with cProfile, one pstats file
+per stage name, and their peak memory is measured: with tracemalloc when
+it is available, otherwise by how much the stage raised the peak resident
+size of the process (ru_maxrss).
+"""
+
+import os
+import sys
+import time
+import threading
+try:
+    import json
+except ImportError:
+    import simplejson as json
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPORT_VERSION = 1
+
+def cpu_time():
+    """User plus system time of this process so far."""
+    t = os.times()
+    return t[0] + t[1]
+
+def peak_rss():
+    """Peak resident size of this process in bytes, None when unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak *= 1024    # KB everywhere else
+    return peak
+
+def memory_method():
+    """How peak memory of a stage is measured here, None when it is not."""
+    if tracemalloc is not None:
+        return "tracemalloc"
+    if resource is not None:
+        return "ru_maxrss"
+    return None
+
+class Stage(object):
+
+    def __init__(self, name, target=None, bytes_in=0, stats=None):
+        self.name = name
+        self.target = target
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.ok = True
+        self.cached = False
+        self.started = time.time()
+        self._cpu = cpu_time()
+        self.wall = None
+        self.cpu = None
+        self.memory_peak = None
+        self.children = []      # JavaUsage of the child processes it ran
+        self._thread = threading.currentThread()
+        self._stats = stats
+
+    def finish(self, bytes_out=0, ok=True, cached=False):
+        if self._stats is not None:
+            self._stats._stop(self)
+            self._stats = None
+        self.wall = time.time() - self.started
+        self.cpu = cpu_time() - self._cpu
+        self.bytes_out = bytes_out
+        self.ok = ok
+        self.cached = cached
+        return self
+
+    def as_dict(self):
+        d = {"stage": self.name, "target": self.target, "started": self.started,
+             "wall": self.wall, "cpu": self.cpu, "bytes_in": self.bytes_in,
+             "bytes_out": self.bytes_out, "ok": self.ok, "cached": self.cached}
+        if self.memory_peak is not None:
+            d["memory_peak"] = self.memory_peak
+        if self.children:
+            d["children"] = [usage.as_dict() for usage in self.children]
+        return d
+
+class BuildStats(object):
+    """Collects the stages of a build. With *profile_dir* every stage runs
+    under cProfile, with *trace_memory* its peak memory is recorded."""
+
+    def __init__(self, profile_dir=None, trace_memory=False):
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.reset()
+
+    def reset(self):
+        self.stages = []
+        self.info = {}          # added to the report as is
+        self.profiles = {}      # stage name -> cProfile.Profile
+        self._active = None     # the stage being profiled or traced
+        self.started = time.time()
+        self._cpu = cpu_time()
+
+    def start(self, name, target=None, bytes_in=0):
+        """Starts timing a stage; call finish() on the result when done.
+        Stages that are never finished are left out. Only the outermost
+        of nested stages is profiled and traced."""
+        if (self.profile_dir or self.trace_memory) and self._active is None:
+            stage = Stage(name, target, bytes_in, self)
+            self._active = stage
+            if self.trace_memory:
+                if tracemalloc is not None:
+                    # restarting drops the traces and so resets the peak
+                    if tracemalloc.is_tracing():
+                        tracemalloc.stop()
+                    tracemalloc.start()
+                else:
+                    stage._rss = peak_rss()
+            if self.profile_dir:
+                if name not in self.profiles:
+                    import cProfile
+                    self.profiles[name] = cProfile.Profile()
+                self.profiles[name].enable()
+        else:
+            stage = Stage(name, target, bytes_in)
+        self.stages.append(stage)
+        return stage
+
+    def add(self, name, target, wall, bytes_in=0, bytes_out=0, cached=False):
+        """Records a stage that ran elsewhere, in a worker thread, and was
+        timed there. Its CPU time is not known."""
+        stage = Stage(name, target, bytes_in)
+        stage.started -= wall
+        stage.wall = wall
+        stage.bytes_out = bytes_out
+        stage.cached = cached
+        self.stages.append(stage)
+        return stage
+
+    def add_child(self, usage):
+        """Attach the resource usage of a child process to the innermost
+        stage this thread still runs."""
+        thread = threading.currentThread()
+        for stage in reversed(self.stages):
+            if stage.wall is None and stage._thread is thread:
+                stage.children.append(usage)
+                return
+
+    def _stop(self, stage):
+        if self.profile_dir:
+            self.profiles[stage.name].disable()
+        if self.trace_memory:
+            if tracemalloc is not None:
+                stage.memory_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            elif stage._rss is not None:
+                stage.memory_peak = peak_rss() - stage._rss
+        self._active = None
+
+    def dump_profiles(self):
+        """Writes the profile of each stage to <profile_dir>/<stage>.pstats,
+        to be read with the pstats module."""
+        if not self.profile_dir:
+            return
+        if not os.path.isdir(self.profile_dir):
+            os.makedirs(self.profile_dir)
+        for name, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(self.profile_dir, name + ".pstats"))
+
+    def totals(self):
+        """{stage name: totals} over the finished stages."""
+        totals = {}
+        for stage in self.stages:
+            if stage.wall is None:
+                continue
+            if stage.name not in totals:
+                totals[stage.name] = {"count": 0, "wall": 0.0, "cpu": 0.0, "bytes_in": 0, "bytes_out": 0}
+            total = totals[stage.name]
+            total["count"] += 1
+            total["wall"] += stage.wall
+            if stage.cpu is not None:
+                total["cpu"] += stage.cpu
+            total["bytes_in"] += stage.bytes_in
+            total["bytes_out"] += stage.bytes_out
+            if stage.memory_peak is not None:
+                total["memory_peak"] = max(total.get("memory_peak", 0), stage.memory_peak)
+        return totals
+
+    def report(self, **info):
+        """The JSON report, with *info* (builder version, options) added."""
+        report = {
+            "version": REPORT_VERSION,
+            "started": self.started,
+            "wall": time.time() - self.started,
+            "cpu": cpu_time() - self._cpu,
+            "stages": [stage.as_dict() for stage in self.stages if stage.wall is not None],
+            "totals": self.totals(),
+        }
+        if self.trace_memory:
+            report["memory"] = memory_method()
+        report.update(self.info)
+        report.update(info)
+        return report
+
+    def write(self, fname, **info):
+        tmpname = fname + ".tmp"
+        f = open(tmpname, "w")
+        try:
+            json.dump(self.report(**info), f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+        if os.path.exists(fname) and os.name == "nt":
+            os.unlink(fname)
+        os.rename(tmpname, fname)
+
+    def summary(self):
+        """Text table of the totals, stages in the order they first ran."""
+        totals = self.totals()
+        memory = self.trace_memory and memory_method() is not None
+        header = "%-16s %6s %9s %9s %11s %11s" % ("stage", "count", "wall", "cpu", "in", "out")
+        if memory:
+            header += " %11s" % "peak"
+        lines = [header]
+        seen = set()
+        for stage in self.stages:
+            if stage.name in seen or stage.name not in totals:
+                continue
+            seen.add(stage.name)
+            total = totals[stage.name]
+            line = "%-16s %6d %8.3fs %8.3fs %9dKB %9dKB" % (
+                stage.name, total["count"], total["wall"], total["cpu"],
+                total["bytes_in"] / 1024, total["bytes_out"] / 1024)
+            if memory:
+                line += " %9dKB" % (total.get("memory_peak", 0) / 1024)
+            lines.append(line)
+        lines.append("%-16s %6s %8.3fs %8.3fs" % ("build", "", time.time() - self.started, cpu_time() - self._cpu))
+        return "\n".join(lines)
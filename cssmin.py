@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+
+"""A CSS minifier, so the resources targets do not need a JVM.
+
+It removes comments (except /*! ones and the empty ones of the
+html>/**/body hack) and whitespace that does not
+matter, the last semicolon of a block and empty rules, shortens #aabbcc
+colors to #abc and drops the units of zero lengths. Selectors are only
+trimmed, values are rewritten only inside declaration blocks, and string
+literals are never touched.
+
+cssmin_stream() works on a chunk at a time, cutting the input after a
+complete top level rule, so a stylesheet does not have to be held in
+memory as a whole.
+
+With merge, rules are also merged as far as that cannot change what a
+browser renders: adjacent rules with the same selector become one rule,
+in which a declaration overridden by a later one from another of those
+rules is dropped (within a rule, a repeated property is a fallback for
+older browsers and stays), and adjacent rules with the same declarations
+get their selectors joined. That needs the whole stylesheet at once.
+"""
+
+import re
+
+CHUNK_SIZE = 1 << 16
+
+# comments, strings and unquoted urls (data: ones hold semicolons)
+_PROTECTED = re.compile(r"""/\*[\s\S]*?\*/|"(?:[^"\\\n]|\\[\s\S])*"|'(?:[^'\\\n]|\\[\s\S])*'"""
+                        r"""|[uU][rR][lL]\(\s*(?:[^)"'\s\\]|\\[\s\S])(?:[^)"'\\]|\\[\s\S])*\)""")
+# where a comment, string or url starts that _PROTECTED did not match, it is cut off
+_PARTIAL = re.compile(r"""/\*|["']|/$|[uU][rR][lL]\(\s*(?:[^"'\s]|$)""")
+
+# strings and comments to keep are swapped for markers while minifying
+_MARKER = re.compile(r"\x00(\d+)\x00")
+# no space is needed around these
+_NO_SPACE = "{};,>"
+_SEMICOLONS = re.compile(r";;+")
+_EMPTY_RULE = re.compile(r"(^|[{};])[^{};]*\{\}")
+_BRACES = re.compile(r"([{}])")
+
+# rewriting values, on the declaration blocks joined by "}"
+_COLON = re.compile(r"\s*:\s*")
+# #aabbcc, not in IE filters (chroma(color=#aabbcc))
+_COLOR = re.compile(r"(?<![=#\w])#([0-9a-f])\1([0-9a-f])\2([0-9a-f])\3(?![0-9a-z_-])", re.I)
+# zero lengths; % is left alone, hsl() and keyframes need it
+_ZERO_UNIT = re.compile(r"(?<![\w.#-])(?:0(?:\.0*)?|\.0+)(?:px|em|ex|rem|in|cm|mm|pt|pc|vw|vh)(?![\w%-])")
+_LEADING_ZERO = re.compile(r"(?<![\w.#-])0+(?=\.\d)")
+_FOUR_ZEROS = re.compile(r"((?:^|[;}])(?:margin|padding)(?:-\w+)?):0 0 0 0(?=[;}!]|$)")
+
+def _declarations(css):
+    """Rewrites the values in the innermost blocks of *css*, which holds
+    no comments or strings any more."""
+    parts = _BRACES.split(css)
+    # text, brace, text, brace, ...: a text between { and } is a block of
+    # declarations
+    blocks = [i for i in range(2, len(parts) - 1, 2) if parts[i - 1] == "{" and parts[i + 1] == "}"]
+    if not blocks:
+        return css
+    body = "}".join([parts[i] for i in blocks])
+    body = _COLON.sub(":", body)
+    body = _COLOR.sub(lambda m: "#" + m.group(1) + m.group(2) + m.group(3), body)
+    body = _ZERO_UNIT.sub("0", body)
+    body = _LEADING_ZERO.sub("", body)
+    body = _FOUR_ZEROS.sub(lambda m: m.group(1) + ":0", body)
+    for i, block in zip(blocks, body.split("}")):
+        parts[i] = block
+    return "".join(parts)
+
+def _keep(match, kept, markers):
+    token = match.group(0)
+    if token == "/**/" and match.start() and match.string[match.start() - 1] == ">":
+        # html>/**/body hides a rule from IE 7, keep it as YUI Compressor does
+        pass
+    elif token[:2] == "/*" and token[:3] != "/*!":
+        # a space, "a/**/b" is two words
+        return " "
+    # the same marker for the same token, for telling equal rules
+    if token not in markers:
+        kept.append(token)
+        markers[token] = "\x00%d\x00" % (len(kept) - 1)
+    return markers[token]
+
+# merging rules
+_RULE_END = re.compile(r"[{};]")
+# at-rules holding rules that can be merged, the others are left alone
+_NESTING = ("@media", "@supports", "@document")
+_LONGHANDS = {}
+for _shorthand in ("margin", "padding"):
+    for _side in ("top", "right", "bottom", "left"):
+        _LONGHANDS["%s-%s" % (_shorthand, _side)] = _shorthand
+# selectors every browser parses; a selector it does not parse drops the
+# whole rule, so only these may be joined into one
+_SIMPLE_SELECTOR = re.compile(r"^(?:[\w\s.#*>,-]|:(?:hover|active|focus|link|visited|first-child)\b)+$")
+# values whose support varies between browsers (hacks, vendor prefixes,
+# functions and the keywords older IEs ignore); the later of two
+# declarations only overrides the earlier when it is none of these
+_FALLBACK = re.compile(r"\\|!(?!important)|(?<![\w-])-[a-z]|\b(?!url\(|rgb\()[\w-]+\(|"
+                       r"\b(?:expression|fixed|inherit|initial|unset|inline-block|table[\w-]*|run-in)\b", re.I)
+
+def _parse(css, i=0):
+    """Parses css[i:] up to the closing brace of the block it is in, into
+    ("rule", selector, [(rule number, declaration)]), ("block", prelude,
+    items) and ("text", css) items; returns them and the index after."""
+    items = []
+    n = len(css)
+    while i < n:
+        match = _RULE_END.search(css, i)
+        if match is None:
+            items.append(("text", css[i:]))
+            return items, n
+        j = match.start()
+        c = css[j]
+        if c == "}":
+            if j > i:
+                items.append(("text", css[i:j]))
+            return items, j + 1
+        if c == ";":
+            # @import, @charset and the like
+            items.append(("text", css[i:j + 1]))
+            i = j + 1
+            continue
+        prelude = css[i:j]
+        end = css.find("}", j)
+        if end < 0:
+            end = n
+        if prelude.startswith(_NESTING):
+            inner, i = _parse(css, j + 1)
+            items.append(("block", prelude, inner))
+        elif prelude.startswith("@") or "{" in css[j + 1:end]:
+            # @font-face, @page, @keyframes and nested rules: kept as they are
+            depth = 0
+            for match in _BRACES.finditer(css, j):
+                depth += match.group(0) == "{" and 1 or -1
+                if depth == 0:
+                    break
+            items.append(("text", css[i:match.end()]))
+            i = match.end()
+        else:
+            number = len(items)
+            items.append(("rule", prelude, [(number, decl) for decl in css[j + 1:end].split(";") if decl]))
+            i = end + 1
+    return items, i
+
+def _drop_overridden(declarations):
+    """Drops the declarations a later one makes useless: a repeated one,
+    or one overridden by a later one from another rule."""
+    kept = []
+    seen = {}
+    last = {}   # property -> (rule number, important, value) of the last one
+    for number, decl in reversed(declarations):
+        if decl in seen:
+            continue
+        prop, value = (decl.split(":", 1) + [""])[:2]
+        prop = prop.lower()
+        important = value.endswith("!important")
+        later = last.get(prop) or last.get(_LONGHANDS.get(prop))
+        if later is not None:
+            later_number, later_important, later_value = later
+            if later_number != number and (later_important or not important) \
+                    and not _FALLBACK.search(later_value):
+                continue
+        kept.append((number, decl))
+        seen[decl] = True
+        if prop not in last:
+            last[prop] = (number, important, value)
+    kept.reverse()
+    return kept
+
+def _merge(items):
+    merged = []
+    for item in items:
+        if item[0] == "block":
+            item = ("block", item[1], _merge(item[2]))
+        elif item[0] == "rule" and merged and merged[-1][0] == "rule" and merged[-1][1] == item[1]:
+            merged[-1] = ("rule", item[1], merged[-1][2] + item[2])
+            continue
+        merged.append(item)
+    joined = []
+    for item in merged:
+        if item[0] == "rule":
+            item = ("rule", item[1], _drop_overridden(item[2]))
+            if joined and joined[-1][0] == "rule" and \
+                    [d for n, d in joined[-1][2]] == [d for n, d in item[2]] and \
+                    _SIMPLE_SELECTOR.match(joined[-1][1]) and _SIMPLE_SELECTOR.match(item[1]):
+                joined[-1] = ("rule", joined[-1][1] + "," + item[1], joined[-1][2])
+                continue
+        joined.append(item)
+    return joined
+
+def _format(items):
+    parts = []
+    for item in items:
+        if item[0] == "text":
+            parts.append(item[1])
+        elif item[0] == "block":
+            parts.append("%s{%s}" % (item[1], _format(item[2])))
+        else:
+            parts.append("%s{%s}" % (item[1], ";".join([decl for number, decl in item[2]])))
+    return "".join(parts)
+
+def _minify(css, merge=False):
+    """Minifies a piece of a stylesheet that ends at a top level rule."""
+    kept = []
+    markers = {}
+    css = _PROTECTED.sub(lambda m: _keep(m, kept, markers), css)
+    # whitespace runs are single spaces from here on
+    css = " ".join(css.split())
+    for c in _NO_SPACE:
+        css = css.replace(" " + c, c).replace(c + " ", c)
+    css = css.replace("( ", "(").replace(" )", ")")
+    css = _SEMICOLONS.sub(";", css)
+    css = _declarations(css)
+    css = css.replace(";}", "}")
+    while "{}" in css:
+        # a block left empty makes the one around it empty too
+        shorter = _EMPTY_RULE.sub(r"\1", css)
+        if shorter == css:
+            break
+        css = shorter
+    css = css.strip()
+    if merge:
+        css = _format(_merge(_parse(css)[0]))
+    if kept:
+        css = _MARKER.sub(lambda m: kept[int(m.group(1))], css)
+    return css
+
+def _cut(css):
+    """Index after the last complete top level rule in *css*, 0 when there
+    is none yet."""
+    # comments, strings and urls blanked out, the offsets stay the same
+    plain = _PROTECTED.sub(lambda m: " " * len(m.group(0)), css)
+    partial = _PARTIAL.search(plain)
+    if partial is not None:
+        plain = plain[:partial.start()]
+    end = plain.rfind("}")
+    if end < 0:
+        return 0
+    if plain.count("{", 0, end) == plain.count("}", 0, end + 1):
+        # the usual case, the last rule is at the top level
+        return end + 1
+    depth = 0
+    cut = 0
+    for match in _BRACES.finditer(plain):
+        if match.group(0) == "{":
+            depth += 1
+        else:
+            depth = max(depth - 1, 0)
+            if depth == 0:
+                cut = match.end()
+    return cut
+
+def cssmin_stream(source, chunk_size=CHUNK_SIZE, merge=False):
+    """Minifies *source*, a string, a file object or an iterable of
+    strings, and yields the result in pieces of whole rules. With *merge*
+    *source* is read as a whole first."""
+    if hasattr(source, "read"):
+        chunks = iter(lambda: source.read(chunk_size), "")
+    elif isinstance(source, basestring):
+        chunks = iter([source])
+    else:
+        chunks = iter(source)
+    if merge:
+        data = _minify("".join(chunks), True)
+        if data:
+            yield data
+        return
+    buf = ""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buf += chunk
+        cut = _cut(buf)
+        if cut:
+            data = _minify(buf[:cut])
+            buf = buf[cut:]
+            if data:
+                yield data
+    data = _minify(buf)
+    if data:
+        yield data
+
+def cssmin_file(source, outfile, chunk_size=CHUNK_SIZE, merge=False):
+    """Minifies *source*, anything cssmin_stream() takes, into the file
+    object *outfile*."""
+    for data in cssmin_stream(source, chunk_size, merge):
+        outfile.write(data)
+
+def cssmin(css, merge=False):
+    return _minify(css, merge)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""Inlining of small images into CSS as data: URIs.
+
+The CSS targets point at many small gif and png sprites, and each of them
+costs a request on the first page load. ImageInliner replaces url()
+references to local images up to a size limit with data: URIs of their
+contents. References are resolved against the directory of the CSS file
+they are written in; absolute and remote urls, and images that are
+missing, of an unknown type or too large are left alone. So are images
+referenced more than once in a stylesheet, the sprites most of all: every
+reference would get a copy of the image, and one request for it is less
+than that. count() finds those.
+
+IE before version 8 shows no data: URIs at all, IE 8 none over 32KB; those
+are never made.
+"""
+
+import os
+import re
+import base64
+import urllib
+
+# longest data: URI IE 8 shows
+MAX_URI_LENGTH = 32768
+
+MIME_TYPES = {
+    ".gif": "image/gif",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".svg": "image/svg+xml",
+}
+
+# comments are matched to be skipped
+_URL = re.compile(r"""/\*[\s\S]*?\*/|[uU][rR][lL]\(\s*(["']?)([^"'()\s]+)\1\s*\)""")
+# a scheme (http:, data:) or a path from the root of the server
+_ABSOLUTE = re.compile(r"^(?:[a-zA-Z][\w+.-]*:|/)")
+
+class ImageInliner(object):
+    """Inlines images of at most *max_size* bytes."""
+
+    def __init__(self, max_size=0):
+        self.max_size = max_size
+        self._uris = {}     # path -> ((mtime, size), data: URI)
+
+    def data_uri(self, fname):
+        """The data: URI of an image, None when it is not to be inlined."""
+        mime = MIME_TYPES.get(os.path.splitext(fname)[1].lower())
+        if mime is None:
+            return None
+        try:
+            st = os.stat(fname)
+        except OSError:
+            return None
+        if st.st_size > self.max_size:
+            return None
+        stamp = (st.st_mtime, st.st_size)
+        if fname not in self._uris or self._uris[fname][0] != stamp:
+            f = open(fname, "rb")
+            try:
+                data = f.read()
+            finally:
+                f.close()
+            self._uris[fname] = (stamp, "data:%s;base64,%s" % (mime, base64.b64encode(data)))
+        uri = self._uris[fname][1]
+        if len(uri) > MAX_URI_LENGTH:
+            return None
+        return uri
+
+    def count(self, css, basedir, counts):
+        """Adds the references of *css*, read from a file in *basedir*, to
+        *counts*, local image -> number of references."""
+        for match in _URL.finditer(css):
+            fname = _local_file(match.group(2), basedir)
+            if fname is not None:
+                counts[fname] = counts.get(fname, 0) + 1
+        return counts
+
+    def inline(self, css, basedir, images=None, shared=()):
+        """Returns *css*, read from a file in *basedir*, with its images
+        inlined, and the number of bytes that added. The images in *shared*
+        are left alone. *images* is filled with the local images referenced,
+        mapped to whether they were inlined, so a change to any of them can
+        trigger a rebuild."""
+        if images is None:
+            images = {}
+        added = [0]
+        def replace(match):
+            fname = _local_file(match.group(2), basedir)
+            if fname is None:
+                return match.group(0)
+            uri = fname not in shared and self.data_uri(fname) or None
+            images[fname] = images.get(fname) or uri is not None
+            if uri is None:
+                return match.group(0)
+            inlined = "url(%s)" % uri
+            added[0] += len(inlined) - len(match.group(0))
+            return inlined
+        css = _URL.sub(replace, css)
+        return css, added[0]
+
+def _local_file(url, basedir):
+    """The file a url() in a stylesheet in *basedir* points at, None when
+    it is not a local one."""
+    if url is None or _ABSOLUTE.match(url):
+        return None
+    return os.path.normpath(os.path.join(basedir, urllib.unquote(url.split("?")[0].split("#")[0])))
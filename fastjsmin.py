@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+"""A buffer based jsmin with the exact output of the included jsmin.
+
+The included JavascriptMinify reads one character at a time through
+method calls, which makes it crawl on ext-all.js. This engine runs the
+same A/B state machine, but over an in-memory string by index:
+
+  * control characters are translated for the whole buffer at once,
+  * runs of plain code, string literals, regular expression literals and
+    comments are found with precompiled regexes and copied or skipped in
+    bulk,
+  * a run of whitespace is collapsed into a single space or newline, which
+    is what the state machine does with it one character at a time,
+  * between two characters of plain code that decision only depends on
+    those two characters, so code up to the next quote or slash is
+    squeezed with a few regex substitutions in one go.
+
+jsmin_stream() feeds the engine chunk by chunk and yields the output as it
+goes, for bundles that should not be held in memory as a whole.
+"""
+
+import re
+import codecs
+import itertools
+
+class UnterminatedComment(Exception):
+    pass
+
+class UnterminatedStringLiteral(Exception):
+    pass
+
+class UnterminatedRegularExpression(Exception):
+    pass
+
+EOF = '\000'
+
+def _translated(c):
+    # what JavascriptMinify._get() returns for a character
+    if c == '\r':
+        return '\n'
+    if c < ' ' and c != '\n':
+        return ' '
+    return c
+
+_TRANSLATION = "".join([_translated(chr(i)) for i in range(256)])
+
+# isAlphanum(), ord(c) > 126 is tested separately as c > '~'
+_ALNUM = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$\\")
+# characters that end a run of plain code
+_SPECIAL = frozenset(" \n/'\"" + EOF)
+# a '/' after one of these starts a regular expression literal
+_REGEX_PRECEDERS = frozenset("(,=:[?!&|")
+# in the state machine a newline is kept before these ...
+_NEWLINE_BEFORE = frozenset("{[(+-")
+# ... and after these
+_NEWLINE_AFTER = frozenset("}])+-\"'")
+
+_WHITESPACE = re.compile(r"[ \n]*")
+# plain code with whitespace inside it, ending in plain code
+_RUN = re.compile(r"""[^ \n/'"]+(?:[ \n]+[^ \n/'"]+)*""")
+# squeezing whitespace in a run: a newline stays between a character of
+# _NEWLINE_AFTER or _ALNUM and one of _NEWLINE_BEFORE or _ALNUM, a space
+# between two of _ALNUM. Kept ones are marked first and restored at the end.
+_ALNUM_CLASS = r"A-Za-z0-9_$\\\x7f-\xff"
+_KEEP_NEWLINE = re.compile(r"(?<=[%s\}\]\)\+\-])[ \n]*\n[ \n]*(?=[%s\{\[\(\+\-])" % (_ALNUM_CLASS, _ALNUM_CLASS))
+_NEWLINES = re.compile(r"[ \n]*\n[ \n]*")
+_KEEP_SPACE = re.compile(r"(?<=[%s]) +(?=[%s])" % (_ALNUM_CLASS, _ALNUM_CLASS))
+_SPACES = re.compile(r" +")
+_UNMARK = "".join([chr(i) for i in range(256)]).replace("\x01", "\n").replace("\x02", " ")
+
+def _squeeze(run):
+    if '\n' in run:
+        run = _NEWLINES.sub("", _KEEP_NEWLINE.sub("\x01", run))
+    return _SPACES.sub("", _KEEP_SPACE.sub("\x02", run)).translate(_UNMARK)
+
+# string bodies after the opening quote, up to and including the closing one
+_STRING = {
+    "'": re.compile(r"[^'\\\n]*(?:\\[\s\S][^'\\\n]*)*'"),
+    '"': re.compile(r'[^"\\\n]*(?:\\[\s\S][^"\\\n]*)*"'),
+}
+# regular expression body after the opening slash, including the closing one
+_REGEX = re.compile(r"[^/\\\n]*(?:\\[\s\S][^/\\\n]*)*/")
+
+CHUNK_SIZE = 1 << 16
+
+class _NeedMore(Exception):
+    """The token at the end of the buffer may go on in the next chunk."""
+
+def _jsmin_chunks(chunks):
+    """The engine: minifies an iterator of byte strings. Each step of the
+    state machine either completes on the buffer or is retried once the
+    next chunk is appended; everything before the step is dropped then."""
+    s = ""
+    n = 0
+    final = False
+    out = []
+    write = out.append
+    run = _RUN.match
+    whitespace = _WHITESPACE.match
+    find = s.find
+
+    def fetch(i):
+        """JavascriptMinify._next() at index i: returns the next character
+        with comments removed and the index after it."""
+        if i >= n:
+            if final:
+                return EOF, n
+            raise _NeedMore()
+        c = s[i]
+        i += 1
+        if c == '/':
+            if i >= n:
+                if final:
+                    return c, i
+                raise _NeedMore()
+            p = s[i]
+            if p == '/':
+                j = find('\n', i + 1)
+                if j < 0:
+                    if final:
+                        return EOF, n
+                    raise _NeedMore()
+                c = '\n'
+                i = j + 1
+            elif p == '*':
+                j = find('*/', i + 1)
+                if j < 0:
+                    if final:
+                        raise UnterminatedComment()
+                    raise _NeedMore()
+                c = ' '
+                i = j + 2
+            else:
+                return c, i
+        if c == ' ' or c == '\n':
+            # the rest of a whitespace run does not change the outcome,
+            # except that a newline in it wins over spaces
+            j = whitespace(s, i).end()
+            if j == n and not final:
+                raise _NeedMore()
+            if j > i:
+                if c == ' ' and find('\n', i, j) >= 0:
+                    c = '\n'
+                i = j
+        return c, i
+
+    a = '\n'
+    i = 0       # where the next step starts, b is fetched from here
+    leading = True
+    while 1:
+        try:
+            b, j = fetch(i)
+            if b == '/' and a in _REGEX_PRECEDERS:
+                m = _REGEX.match(s, j)
+                if m is None:
+                    if final:
+                        raise UnterminatedRegularExpression()
+                    raise _NeedMore()
+                k = m.end()
+                write(a)
+                write('/')
+                write(s[j:k - 1])
+                a = '/'
+                i = k
+                continue
+
+            # pick the action exactly like JavascriptMinify._jsmin()
+            if a == ' ':
+                if b in _ALNUM or b > '~':
+                    action = 1
+                else:
+                    action = 2
+            elif a == '\n':
+                if b in _NEWLINE_BEFORE:
+                    action = 1
+                elif b == ' ':
+                    action = 3
+                elif b in _ALNUM or b > '~':
+                    action = 1
+                else:
+                    action = 2
+            elif b == ' ':
+                if a in _ALNUM or a > '~':
+                    action = 1
+                else:
+                    action = 3
+            elif b == '\n':
+                if a in _NEWLINE_AFTER or a in _ALNUM or a > '~':
+                    action = 1
+                else:
+                    action = 3
+            else:
+                action = 1
+
+            if action == 1 and b not in _SPECIAL:
+                # b starts a run of plain code, which is copied (squeezed) up
+                # to its last character; that one becomes the new a
+                k = run(s, j - 1).end()
+                if k == n and not final:
+                    # stop short of the end, the run may go on
+                    k = j - 1 + len(s[j - 1:n - 1].rstrip(" \n"))
+                    if k < j:
+                        raise _NeedMore()
+                code = s[j - 1:k]
+                if ' ' in code or '\n' in code:
+                    code = _squeeze(code)
+                write(a)
+                write(code[:-1])
+                a = s[k - 1]
+                i = k
+            elif action <= 2:
+                if b == "'" or b == '"':
+                    m = _STRING[b].match(s, j)
+                    if m is None:
+                        if final:
+                            raise UnterminatedStringLiteral()
+                        raise _NeedMore()
+                    k = m.end()
+                    if action == 1:
+                        write(a)
+                    write(b)
+                    write(s[j:k - 1])
+                    j = k
+                elif action == 1:
+                    write(a)
+                a = b
+                i = j
+                if a == EOF:
+                    break
+            else:
+                i = j
+            continue
+        except _NeedMore:
+            pass
+
+        # append the next chunk to what is left of the buffer
+        chunk = None
+        for chunk in chunks:
+            if chunk:
+                break
+        if chunk:
+            s = s[i:] + chunk.translate(_TRANSLATION)
+        else:
+            s = s[i:]
+            final = True
+        n = len(s)
+        i = 0
+        find = s.find
+        if out:
+            data = "".join(out)
+            del out[:]
+            if leading:
+                leading = False
+                if data[:1] == '\n':
+                    data = data[1:]
+            yield data
+
+    data = "".join(out)
+    if leading and data[:1] == '\n':
+        data = data[1:]
+    if data:
+        yield data
+
+def jsmin_stream(source, chunk_size=CHUNK_SIZE):
+    """Minifies *source*, a string, a file object or an iterable of
+    strings, and yields the result in chunks. Only the token that is cut
+    off at the end of a chunk is kept around, so memory use is bounded by
+    the largest token (string, regular expression, comment) rather than
+    by the size of the input."""
+    if hasattr(source, "read"):
+        chunks = iter(lambda: source.read(chunk_size), "")
+    elif isinstance(source, basestring):
+        chunks = iter([source])
+    else:
+        chunks = iter(source)
+    first = ""
+    for first in chunks:
+        if first:
+            break
+    if not isinstance(first, unicode):
+        for data in _jsmin_chunks(itertools.chain([first], chunks)):
+            yield data
+        return
+    # non-ASCII characters only ever count as alphanumeric, and so do all
+    # bytes of their UTF-8 encoding
+    encoded = itertools.imap(lambda chunk: chunk.encode("utf-8"), itertools.chain([first], chunks))
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for data in _jsmin_chunks(encoded):
+        data = decoder.decode(data)
+        if data:
+            yield data
+    data = decoder.decode("", True)
+    if data:
+        yield data
+
+def jsmin_file(source, outfile, chunk_size=CHUNK_SIZE):
+    """Minifies *source*, anything jsmin_stream() takes, into the file
+    object *outfile*."""
+    for data in jsmin_stream(source, chunk_size):
+        outfile.write(data)
+
+def jsmin(js):
+    if isinstance(js, unicode):
+        return u"".join(jsmin_stream(js))
+    return "".join(_jsmin_chunks(iter([js])))
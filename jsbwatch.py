@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+"""File watching for the --watch mode of the builder.
+
+Uses inotify (through ctypes, no extra packages needed) on Linux and
+falls back to polling mtimes everywhere else. Directories are watched
+rather than files, since most editors save by writing a new file and
+renaming it over the old one.
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+
+DEBOUNCE = 0.25       # seconds without events before a burst counts as done
+POLL_INTERVAL = 1.0   # seconds between scans of the polling watcher
+
+class PollingWatcher(object):
+
+    def __init__(self, paths):
+        self.set_paths(paths)
+
+    def _stat(self, fname):
+        try:
+            st = os.stat(fname)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def set_paths(self, paths):
+        self.paths = set([os.path.normpath(p) for p in paths])
+        self._stats = dict([(p, self._stat(p)) for p in self.paths])
+
+    def changes(self, timeout=None):
+        """Returns the set of watched paths that changed, waiting at most
+        *timeout* seconds (forever when None) for the first change."""
+        deadline = timeout is not None and time.time() + timeout or None
+        while 1:
+            changed = set()
+            for p in self.paths:
+                st = self._stat(p)
+                if st != self._stats[p]:
+                    self._stats[p] = st
+                    changed.add(p)
+            if changed:
+                return changed
+            if deadline is not None and time.time() >= deadline:
+                return changed
+            wait = POLL_INTERVAL
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.time(), 0))
+            time.sleep(wait)
+
+    def close(self):
+        pass
+
+class InotifyWatcher(object):
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, paths):
+        import ctypes, ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self._dirs = {}   # watch descriptor -> directory
+        self.set_paths(paths)
+
+    def set_paths(self, paths):
+        self.paths = set([os.path.normpath(p) for p in paths])
+        for dirname in set([os.path.dirname(p) for p in self.paths]):
+            if dirname in self._dirs.values():
+                continue
+            wd = self._libc.inotify_add_watch(self.fd, dirname or ".", self.MASK)
+            if wd >= 0:
+                self._dirs[wd] = dirname
+
+    def changes(self, timeout=None):
+        changed = set()
+        while not changed:
+            ready = select.select([self.fd], [], [], timeout)[0]
+            if not ready:
+                break
+            try:
+                buf = os.read(self.fd, 1 << 16)
+            except OSError, e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            pos = 0
+            while pos < len(buf):
+                wd, mask, cookie, length = self.EVENT.unpack_from(buf, pos)
+                pos += self.EVENT.size
+                name = buf[pos:pos + length].rstrip("\0")
+                pos += length
+                if wd in self._dirs:
+                    fname = os.path.normpath(os.path.join(self._dirs[wd], name))
+                    if fname in self.paths:
+                        changed.add(fname)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+def make_watcher(paths):
+    try:
+        return InotifyWatcher(paths)
+    except (ImportError, OSError, AttributeError):
+        return PollingWatcher(paths)
+
+def wait_for_changes(watcher, debounce=DEBOUNCE):
+    """Blocks until watched files change and returns them, after waiting for
+    a burst of saves to settle."""
+    changed = watcher.changes()
+    while 1:
+        more = watcher.changes(debounce)
+        if not more:
+            return changed
+        changed |= more
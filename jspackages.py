@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+
+"""On-demand packages of ext-all.js.
+
+ext-all.js holds every source file of ext.jsb in include order, so a page
+that only uses forms and grids still downloads everything. split_packages()
+cuts the include list into one package per source directory (core, util,
+widgets/grid, ...) and works out which packages each one needs loaded
+first, from what its files define and refer to:
+
+  * a file defines the names of capitalized globals it assigns to (Ext =
+    ..., Ext.Panel = ..., Ext.util.Observable.prototype = ...) and the
+    namespaces it creates with Ext.namespace() or Ext.ns(),
+  * every dotted name in its code (Ext.extend(Ext.Component, ...),
+    Ext.util.Observable.call(this)) is a reference, to the file defining
+    the longest prefix of it, and so is the namespace it assigns in.
+
+A reference to a file earlier in the include list makes the package
+require the one of that file, which is loaded before it; the include order
+stays what it has always been. One to a later file can only be used at
+run time (new Ext.data.Store() in a method of GridPanel), so the package
+uses the one of that file, which is loaded after it. Packages that require
+each other are joined into one.
+
+loader_script() writes a small script with the packages, the files they
+are in and what they require and use, and ExtPackages.load(), which loads
+packages with everything they need in the right order.
+"""
+
+import os
+import re
+try:
+    import json
+except ImportError:
+    import simplejson as json
+import fastjsmin
+
+LOADER_NAME = "packages.js"
+MANIFEST_NAME = "packages.json"
+
+_STRING = re.compile(r""""(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'""")
+_NAMESPACE = re.compile(r"\bExt\.(?:namespace|ns)\(([^)]*)\)")
+_NAMESPACE_ARG = re.compile(r"""["']([\w$.]+)["']""")
+# an assignment at the start of a statement, not a var
+_DEFINE = re.compile(r"(?:^|[;{}\n])\s*([A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)*)\s*=(?!=)")
+_REFERENCE = re.compile(r"(?<![\w$.])[A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)+")
+
+_scans = {}     # file -> (source, (defines, references))
+
+def scan(source):
+    """Returns the names *source* defines and the dotted names it refers
+    to, as two sets."""
+    try:
+        code = fastjsmin.jsmin(source)
+    except Exception:
+        # comments then count too, which only adds dependencies
+        code = source
+    defines = set()
+    for match in _NAMESPACE.finditer(code):
+        for name in _NAMESPACE_ARG.findall(match.group(1)):
+            parts = name.split(".")
+            for i in range(1, len(parts) + 1):
+                defines.add(".".join(parts[:i]))
+    code = _STRING.sub('""', code)
+    references = set(_REFERENCE.findall(code))
+    for name in _DEFINE.findall(code):
+        # locals and this.x are not capitalized
+        if name[0].isupper():
+            defines.add(name)
+            if "." in name:
+                # Ext.util.Observable = ... needs Ext.util
+                references.add(name[:name.rindex(".")])
+    return defines, references
+
+def _scan(fname, source):
+    if fname not in _scans or _scans[fname][0] != source:
+        _scans[fname] = (source, scan(source))
+    return _scans[fname][1]
+
+def _owner(name, defined):
+    """The file defining the longest prefix of *name* in *defined*."""
+    parts = name.split(".")
+    for i in range(len(parts), 0, -1):
+        owner = defined.get(".".join(parts[:i]))
+        if owner is not None:
+            return owner
+    return None
+
+def file_dependencies(files, sources):
+    """({file: set of the earlier files it needs}, {file: set of the later
+    files it uses at run time}) for the *files* of a target in include
+    order, with their *sources*."""
+    scans = [_scan(fname, source) for fname, source in zip(files, sources)]
+    everywhere = {}     # name -> the first file defining it
+    for fname, (defines, references) in zip(files, scans):
+        for name in defines:
+            everywhere.setdefault(name, fname)
+    position = dict([(fname, i) for i, fname in enumerate(files)])
+    defined = {}        # the same, for the files up to the current one
+    needs = {}
+    uses = {}
+    for fname, (defines, references) in zip(files, scans):
+        needed = set()
+        used = set()
+        for name in references:
+            owner = _owner(name, defined)
+            if owner is not None and owner != fname:
+                needed.add(owner)
+            owner = _owner(name, everywhere)
+            if owner is not None and position[owner] > position[fname]:
+                used.add(owner)
+        needs[fname] = needed
+        uses[fname] = used
+        for name in defines:
+            defined.setdefault(name, fname)
+    return needs, uses
+
+def package_name(fname, rootdir):
+    """The package of a source file: its directory below *rootdir*."""
+    name = os.path.dirname(os.path.normpath(fname))
+    root = os.path.normpath(rootdir)
+    if name == root:
+        return "root"
+    if name.startswith(root + os.sep):
+        name = name[len(root) + 1:]
+    return name.replace(os.sep, "-").replace("/", "-")
+
+class Package(object):
+
+    def __init__(self, name, files):
+        self.name = name
+        self.files = files      # in include order
+        self.requires = []      # names of the packages it needs directly
+        self.uses = []          # names of the later packages it uses at run time
+
+    def __repr__(self):
+        return "<Package %s: %d files, requires %s, uses %s>" % (self.name, len(self.files),
+                                                                ", ".join(self.requires), ", ".join(self.uses))
+
+def _components(names, edges):
+    """Strongly connected components of a graph (Tarjan), each a list."""
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    def visit(v):
+        index[v] = low[v] = len(index)
+        stack.append(v)
+        on_stack.add(v)
+        for w in edges[v]:
+            if w not in index:
+                visit(w)
+                low[v] = min(low[v], low[w])
+            elif w in on_stack:
+                low[v] = min(low[v], index[w])
+        if low[v] == index[v]:
+            component = []
+            while 1:
+                w = stack.pop()
+                on_stack.discard(w)
+                component.append(w)
+                if w == v:
+                    break
+            components.append(component)
+    for v in names:
+        if v not in index:
+            visit(v)
+    return components
+
+def split_packages(files, sources, rootdir):
+    """Splits the *files* of a target, with their *sources*, into packages
+    by directory below *rootdir*. Returns them in an order they can be
+    loaded in."""
+    needs, uses = file_dependencies(files, sources)
+    position = dict([(fname, i) for i, fname in enumerate(files)])
+    names = []
+    members = {}
+    for fname in files:
+        name = package_name(fname, rootdir)
+        if name not in members:
+            names.append(name)
+            members[name] = []
+        members[name].append(fname)
+    edges = dict([(name, set()) for name in names])
+    for fname in files:
+        name = package_name(fname, rootdir)
+        for needed in needs[fname]:
+            if package_name(needed, rootdir) != name:
+                edges[name].add(package_name(needed, rootdir))
+    # packages that need each other become one, named after all of them
+    joined = {}
+    packages = {}
+    for component in _components(names, edges):
+        component.sort(key=names.index)
+        package = Package("+".join(component),
+                          sorted(sum([members[name] for name in component], []), key=position.get))
+        for name in component:
+            joined[name] = package
+        packages[package.name] = package
+    requires = {}
+    for package in packages.values():
+        required = set()
+        for fname in package.files:
+            for needed in needs[fname]:
+                required.add(joined[package_name(needed, rootdir)].name)
+        required.discard(package.name)
+        requires[package.name] = required
+        used = set()
+        for fname in package.files:
+            for later in uses[fname]:
+                used.add(joined[package_name(later, rootdir)].name)
+        used.discard(package.name)
+        package.uses = sorted(used)
+    # in order of the first include, once what they need is in
+    order = []
+    done = set()
+    pending = sorted(packages.values(), key=lambda package: position[package.files[0]])
+    while pending:
+        for package in pending:
+            if requires[package.name] <= done:
+                break
+        pending.remove(package)
+        package.requires = [p.name for p in order if p.name in requires[package.name]]
+        order.append(package)
+        done.add(package.name)
+    return order
+
+def manifest(packages, suffix=".js", debug_suffix="-debug.js"):
+    """The packages as {name: {"file", "debug", "requires", "uses"}} and
+    their load order."""
+    return {
+        "packages": dict([(package.name, {"file": package.name + suffix,
+                                          "debug": package.name + debug_suffix,
+                                          "requires": package.requires,
+                                          "uses": package.uses})
+                          for package in packages]),
+        "order": [package.name for package in packages],
+    }
+
+LOADER = """/* Generated by build_ext_packages.py, do not edit. */
+var ExtPackages = %(manifest)s;
+ExtPackages.loaded = {};
+ExtPackages.debug = false;
+(function(){
+    // package files are next to this script
+    var scripts = document.getElementsByTagName("script"), src = scripts[scripts.length - 1].src;
+    ExtPackages.base = src.substring(0, src.lastIndexOf("/") + 1);
+})();
+/* Loads the packages *names* (a name or an array of them) and the ones
+   they require, in order, then the ones they use, then calls callback.
+   Packages being loaded by an earlier call that is not done yet are
+   loaded again. */
+ExtPackages.load = function(names, callback, scope){
+    var me = this, needed = {}, queue = [], uses = [], i;
+    function need(name){
+        var p = me.packages[name];
+        if(!p){
+            throw "Unknown package " + name;
+        }
+        if(!needed[name] && !me.loaded[name]){
+            needed[name] = true;
+            for(var j = 0; j < p.requires.length; j++){
+                need(p.requires[j]);
+            }
+            uses = uses.concat(p.uses);
+        }
+    }
+    names = typeof names == "string" ? [names] : names;
+    for(i = 0; i < names.length; i++){
+        need(names[i]);
+    }
+    for(i = 0; i < me.order.length; i++){
+        if(needed[me.order[i]]){
+            queue.push(me.order[i]);
+        }
+    }
+    function next(){
+        var name = queue.shift();
+        if(!name){
+            // only used at run time, so they can come after the rest
+            for(var k = uses.length - 1; k >= 0; k--){
+                if(me.loaded[uses[k]]){
+                    uses.splice(k, 1);
+                }
+            }
+            if(uses.length){
+                me.load(uses, callback, scope);
+                return;
+            }
+            if(callback){
+                callback.call(scope || window);
+            }
+            return;
+        }
+        var script = document.createElement("script"), done = false;
+        script.type = "text/javascript";
+        script.src = me.base + me.packages[name][me.debug ? "debug" : "file"];
+        script.onload = script.onreadystatechange = function(){
+            if(done || this.readyState && this.readyState != "loaded" && this.readyState != "complete"){
+                return;
+            }
+            done = true;
+            script.onload = script.onreadystatechange = null;
+            me.loaded[name] = true;
+            next();
+        };
+        document.getElementsByTagName("head")[0].appendChild(script);
+    }
+    next();
+};
+"""
+
+def manifest_json(packages):
+    """manifest() of *packages* as JSON, for other tools."""
+    return json.dumps(manifest(packages), indent=1, sort_keys=True)
+
+def loader_script(packages):
+    """The loader with the manifest() of *packages* built in."""
+    return LOADER % {"manifest": json.dumps(manifest(packages), sort_keys=True)}
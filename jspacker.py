@@ -41,9 +41,9 @@ class ParseMaster:
     def __init__(self):
         # private
         self._patterns = Patterns()   # patterns stored by index
-        self._escaped = []
         self.ignoreCase = False
         self.escapeChar = None
+        self._compiled = None         # see _compile()
 
     def DELETE(self, match, offset):
         return "\x01" + match.group(offset) + "\x01"
@@ -80,22 +80,56 @@ class ParseMaster:
                 replacement = lambda a,o: self._repl(a,o,r,i)
         # pass the modified arguments
         self._patterns.append(Pattern(expression, replacement, length))
+        self._compiled = None
+
+    # compile the combined regex once, along with a table that maps the
+    # group number of each pattern (match.lastindex, since the group around
+    # a pattern closes last) to its replacement
+    def _compile(self):
+        if self._compiled is None or self._compiled[0] != self.ignoreCase:
+            if self.ignoreCase:
+                r = re.compile(str(self._patterns), re.I | re.M)
+            else:
+                r = re.compile(str(self._patterns), re.M)
+            table = {}
+            i = 1
+            for pattern in self._patterns:
+                if re.compile(pattern.expression).groups + 1 != pattern.length:
+                    # the counted groups are off (e.g. "(?:"), group
+                    # numbers do not line up; use the linear lookup
+                    table = None
+                    break
+                table[i] = (pattern.replacement, i)
+                i = i+pattern.length
+            self._compiled = (self.ignoreCase, r, table)
+        return self._compiled
 
     # execute the global replacement
     def execute(self, string):
-        if self.ignoreCase:
-            r = re.compile(str(self._patterns), re.I | re.M)
+        ignoreCase, r, table = self._compile()
+        # the escaped characters are kept per call, so that one
+        # ParseMaster can be used from several threads
+        string, escaped = self._escape(string, self.escapeChar)
+        if table is None:
+            string = r.sub(self._replacement, string)
         else:
-            r = re.compile(str(self._patterns), re.M)
-        string = self._escape(string, self.escapeChar)
-        string = r.sub(self._replacement, string)
-        string = self._unescape(string, self.escapeChar)
+            def replacement(match):
+                replacement, i = table[match.lastindex]
+                if callable(replacement):
+                    return replacement(match, i)
+                elif isinstance(replacement, (int, long)):
+                    return match.group(replacement+i)
+                else:
+                    return replacement
+            string = r.sub(replacement, string)
+        string = self._unescape(string, self.escapeChar, escaped)
         string = ParseMaster.DELETED.sub("", string)
         return string
 
     # clear the patterns collections so that this object may be re-used
     def reset(self):
         self._patterns = Patterns()
+        self._compiled = None
 
     # this is the global replace function (it's quite complicated)
     def _replacement(self, match):
@@ -113,32 +147,29 @@ class ParseMaster:
             else:
                 i = i+pattern.length
 
-    # encode escaped characters
+    # encode escaped characters, returns the string and the list of
+    # characters that followed the escapeChar
     def _escape(self, string, escapeChar=None):
-        def repl(match):
-            char = match.group(1)
-            self._escaped.append(char)
-            return escapeChar
         if escapeChar is None:
-            return string
+            return string, []
         r = re.compile("\\"+escapeChar+"(.)", re.M)
-        result = r.sub(repl, string)
-        return result
-
-    # decode escaped characters
-    def _unescape(self, string, escapeChar=None):
-        def repl(match):
-            try:
-                #result = eval("'"+escapeChar + self._escaped.pop(0)+"'")
-                result = escapeChar + self._escaped.pop(0)
-                return result
-            except IndexError:
-                return escapeChar
+        # split() alternates the text between escapes and the escaped chars
+        parts = r.split(string)
+        return escapeChar.join(parts[0::2]), parts[1::2]
+
+    # decode escaped characters: the n-th escapeChar gets the n-th escaped
+    # character back, those without one stay alone
+    def _unescape(self, string, escapeChar=None, escaped=()):
         if escapeChar is None:
             return string
-        r = re.compile("\\"+escapeChar, re.M)
-        result = r.sub(repl, string)
-        return result
+        parts = string.split(escapeChar)
+        n = len(parts) - 1
+        chars = [escapeChar + char for char in escaped[:n]]
+        chars.extend([escapeChar] * (n - len(chars)))
+        result = [None] * (2 * n + 1)
+        result[0::2] = parts
+        result[1::2] = chars
+        return "".join(result)
 
     def _internalEscape(self, string):
         return ParseMaster.ESCAPE.sub("", string)
@@ -153,6 +184,9 @@ class ParseMaster:
 ## http://dean.edwards.name/packer/
 
 class JavaScriptPacker:
+    # packed boot functions by (encoding, fastDecode, ascii)
+    _unpackers = {}
+
     def __init__(self):
         self._basicCompressionParseMaster = self.getCompressionParseMaster(False)
         self._specialCompressionParseMaster = self.getCompressionParseMaster(True)
@@ -267,74 +301,66 @@ class JavaScriptPacker:
             result.append(x)
         return "".join(result)
 
-    def encodeKeywords(self, script, encoding, fastDecode):
+    def encodeKeywords(self, script, encoding, fastDecode, chunkSize=0):
         # escape high-ascii values already in the script (i.e. in strings)
         if (encoding > 62):
             script = self.escape95(script)
-        # create the parser
-        parser = ParseMaster()
         encode = self.getEncoder(encoding)
         # for high-ascii, don't encode single character low-ascii
         if encoding > 62:
             regexp = r"""\w\w+"""
         else:
             regexp = r"""\w+"""
-        # build the word list
-        keywords = self.analyze(script, regexp, encode)
+        # build the word list, split() keeps the words at the odd indices
+        # so they can be encoded in place without a second scan
+        parts = re.compile("(" + regexp + ")", re.M).split(script)
+        words = parts[1::2]
+        keywords = self.analyze(script, regexp, encode, words)
         encoded = keywords['encoded']
-        # encode
-        def repl(match, offset):
-            return encoded.get(match.group(offset), "")
-        parser.add(regexp, repl)
+        # encode, dropping deleted sections like ParseMaster.execute()
+        parts[1::2] = map(encoded.__getitem__, words)
+        script = ParseMaster.DELETED.sub("", "".join(parts))
         # if encoded, wrap the script in a decoding function
-        script = parser.execute(script)
-        script = self.bootStrap(script, keywords, encoding, fastDecode)
+        script = self.bootStrap(script, keywords, encoding, fastDecode, chunkSize)
         return script
 
-    def analyze(self, script, regexp, encode):
+    def analyze(self, script, regexp, encode, words=None):
         # analyse
-        # retreive all words in the script
-        regexp = re.compile(regexp, re.M)
-        all = regexp.findall(script)
+        # retreive all words in the script, unless the caller already did
+        if words is None:
+            words = re.compile(regexp, re.M).findall(script)
         sorted = [] # list of words sorted by frequency
         encoded = {} # dictionary of word->encoding
         protected = {} # instances of "protected" words
-        if all:
-            unsorted = []
-            _protected = {}
-            values = {}
+        if words:
             count = {}
-            all.reverse()
-            for word in all:
-                word = "$"+word
-                if word not in count:
-                    count[word] = 0
-                    j = len(unsorted)
-                    unsorted.append(word)
-                    # make a dictionary of all of the protected words in this script
-                    #  these are words that might be mistaken for encoding
-                    values[j] = encode(j)
-                    _protected["$"+values[j]] = j
-                count[word] = count[word] + 1
-            # prepare to sort the word list, first we must protect
-            #  words that are also used as codes. we assign them a code
-            #  equivalent to the word itself.
+            for word in words:
+                count[word] = count.get(word, 0) + 1
+            # equally frequent words are ranked by their last occurrence,
+            #  the later the higher (dict() keeps the last index given)
+            last = dict(zip(words, xrange(len(words))))
+            values = [encode(i) for i in xrange(len(last))]
+            # protect words that are also used as codes. we assign them a
+            #  code equivalent to the word itself.
             # e.g. if "do" falls within our encoding range
             #      then we store keywords["do"] = "do";
             # this avoids problems when decoding
-            sorted = [None] * len(unsorted)
-            for word in unsorted:
-                if word in _protected and isinstance(_protected[word], int):
-                    sorted[_protected[word]] = word[1:]
-                    protected[_protected[word]] = True
-                    count[word] = 0
-            unsorted.sort(lambda a,b: count[b]-count[a])
+            codes = dict(zip(values, xrange(len(values))))
+            sorted = [None] * len(values)
+            ranked = []
+            for word in last:
+                if word in codes:
+                    sorted[codes[word]] = word
+                    protected[codes[word]] = True
+                else:
+                    ranked.append((-count[word], -last[word], word))
+            ranked.sort()
             j = 0
-            for i in range(len(sorted)):
+            for i in xrange(len(sorted)):
                 if sorted[i] is None:
-                    sorted[i]  = unsorted[j][1:]
+                    sorted[i] = ranked[j][2]
                     j = j + 1
-                encoded[sorted[i]] = values[i]
+            encoded = dict(zip(sorted, values))
         return {'sorted': sorted, 'encoded': encoded, 'protected': protected}
 
     def encodePrivate(self, charCode):
@@ -361,13 +387,15 @@ class JavaScriptPacker:
         return parser.execute(script)
 
     # build the boot function used for loading and decoding
-    def bootStrap(self, packed, keywords, encoding, fastDecode):
-        ENCODE = re.compile(r"""\$encode\(\$count\)""")
+    def bootStrap(self, packed, keywords, encoding, fastDecode, chunkSize=0):
         # $packed: the packed script
-        #packed = self.escape(packed)
-        #packed = [packed[x*10000:(x+1)*10000] for x in range((len(packed)/10000)+1)]
-        #packed = "'" + "'+\n'".join(packed) + "'\n"
-        packed = "'" + self.escape(packed) + "'"
+        if chunkSize:
+            # an array of string literals of chunkSize characters each,
+            #  joined again when the script is loaded
+            packed = [self.escape(packed[x:x+chunkSize]) for x in range(0, len(packed), chunkSize)] or [""]
+            packed = "['" + "',\n'".join(packed) + "'].join('')"
+        else:
+            packed = "'" + self.escape(packed) + "'"
 
         # $count: number of words contained in the script
         count = len(keywords['sorted'])
@@ -381,6 +409,30 @@ class JavaScriptPacker:
         # convert from a string to an array
         keywords = "'" + "|".join(keywords['sorted']) + "'.split('|')"
 
+        # special case: when $count==0 there ar no keywords. i want to keep
+        #  the basic shape of the unpacking funcion so i'll frig the code...
+        if fastDecode and not count:
+            raise NotImplemented
+            #) $decode = $decode.replace(/(\$count)\s*=\s*1/, "$1=0");
+
+        # the boot function only depends on these, build and pack it once
+        key = (encoding, fastDecode, ascii)
+        if key not in JavaScriptPacker._unpackers:
+            JavaScriptPacker._unpackers[key] = self.getUnpacker(encoding, fastDecode, ascii)
+        unpack = JavaScriptPacker._unpackers[key]
+
+        # arguments
+        params = [packed, str(ascii), str(count), keywords]
+        if fastDecode:
+            # insert placeholders for the decoder
+            params.extend(['0', "{}"])
+
+        # the whole thing
+        return "eval(" + unpack + "(" + ",".join(params) + "))\n";
+
+    # build the packed boot function
+    def getUnpacker(self, encoding, fastDecode, ascii):
+        ENCODE = re.compile(r"""\$encode\(\$count\)""")
         encoding_functions = {
             10: """ function($charCode) {
                         return $charCode;
@@ -427,12 +479,6 @@ class JavaScriptPacker:
                 # perform the encoding inline for lower ascii values
                 if ascii < 36:
                     decode = ENCODE.sub(inline, decode)
-            # special case: when $count==0 there ar no keywords. i want to keep
-            #  the basic shape of the unpacking funcion so i'll frig the code...
-            if not count:
-                raise NotImplemented
-                #) $decode = $decode.replace(/(\$count)\s*=\s*1/, "$1=0");
-
 
         # boot function
         unpack = r"""function($packed, $ascii, $count, $keywords, $encode, $decode) {
@@ -457,18 +503,9 @@ class JavaScriptPacker:
             # perform the encoding inline
             unpack = ENCODE.sub(inline, unpack)
         # pack the boot function too
-        unpack = self.pack(unpack, 0, False, True)
-
-        # arguments
-        params = [packed, str(ascii), str(count), keywords]
-        if fastDecode:
-            # insert placeholders for the decoder
-            params.extend(['0', "{}"])
-
-        # the whole thing
-        return "eval(" + unpack + "(" + ",".join(params) + "))\n";
+        return self.pack(unpack, 0, False, True)
 
-    def pack(self, script, encoding=0, fastDecode=False, specialChars=False, compaction=True):
+    def pack(self, script, encoding=0, fastDecode=False, specialChars=False, compaction=True, chunkSize=0):
         script = script+"\n"
         self._encoding = encoding
         self._fastDecode = fastDecode
@@ -479,7 +516,7 @@ class JavaScriptPacker:
             if compaction:
                 script = self.basicCompression(script)
         if encoding:
-            script = self.encodeKeywords(script, encoding, fastDecode)
+            script = self.encodeKeywords(script, encoding, fastDecode, chunkSize)
         return script
 
 def run():
@@ -0,0 +1,577 @@
+#!/usr/bin/env python
+
+"""Runs the bundled Java compressors (YUI Compressor, ShrinkSafe's
+custom_rhino.jar) without paying for a JVM startup on every invocation.
+
+A small Java class (CompressorDaemon, source below) is compiled once with
+javac and started as a long-lived child process. It loads the jars itself
+and runs their main() in-process for each job it receives over its stdin,
+along with the input of the job, sending the captured stdout/stderr back
+over its stdout. So a compressor that reads its stdin can be fed from
+memory either way; the bundled ones only read files, and YUI Compressor
+only writes them, see the outfile of run_jar(). When no javac is
+available or the daemon dies, jobs fall back to a plain one-shot
+"java -jar <jar> ..." run.
+
+Every run is measured (see JavaUsage) and can be given a timeout, after
+which the JVM is killed.
+"""
+
+import os
+import sys
+import time
+import errno
+import signal
+import atexit
+import shutil
+import tempfile
+import subprocess
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+try:
+    import threading
+except ImportError:
+    import dummy_threading as threading
+
+DAEMON_CLASS = "CompressorDaemon"
+
+# Protocol, one job at a time:
+#   request:  <jar path>\n<argc>\n<arg>\n...<stdin length>\n<stdin>
+#   response: <exit status> <stdout length> <stderr length>\n<stdout><stderr>
+# An empty line as jar path shuts the daemon down.
+DAEMON_SOURCE = r"""
+import java.io.*;
+import java.lang.reflect.*;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.util.HashMap;
+import java.util.jar.JarFile;
+
+public class CompressorDaemon {
+
+    static class ExitTrapped extends SecurityException {
+        final int status;
+        ExitTrapped(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    // jar path -> Main-Class, read once from the jar manifest
+    static HashMap mainClasses = new HashMap();
+    // jar path -> loader, only kept with -Dcompressor.reuseLoaders=true
+    static HashMap loaders = new HashMap();
+    static final boolean reuseLoaders = Boolean.getBoolean("compressor.reuseLoaders");
+
+    static Method mainMethod(String jar) throws Exception {
+        String name = (String) mainClasses.get(jar);
+        if (name == null) {
+            JarFile jf = new JarFile(jar);
+            try {
+                name = jf.getManifest().getMainAttributes().getValue("Main-Class").trim();
+            } finally {
+                jf.close();
+            }
+            mainClasses.put(jar, name);
+        }
+        // a fresh loader per job; the compressors keep static state (Rhino's
+        // shell grabs System.out once and never resets its exit code) that
+        // must not leak between jobs. Reusing loaders is only for measuring
+        // what this costs (benchmark.py daemon).
+        URLClassLoader loader = reuseLoaders ? (URLClassLoader) loaders.get(jar) : null;
+        if (loader == null) {
+            loader = new URLClassLoader(new URL[] { new File(jar).toURI().toURL() },
+                                        CompressorDaemon.class.getClassLoader());
+            if (reuseLoaders)
+                loaders.put(jar, loader);
+        }
+        return Class.forName(name, true, loader).getMethod("main", new Class[] { String[].class });
+    }
+
+    static String readLine(InputStream in) throws IOException {
+        ByteArrayOutputStream buf = new ByteArrayOutputStream();
+        int c;
+        while ((c = in.read()) != '\n') {
+            if (c == -1)
+                return null;
+            buf.write(c);
+        }
+        return buf.toString("UTF-8");
+    }
+
+    public static void main(String[] argv) throws Exception {
+        InputStream in = new BufferedInputStream(new FileInputStream(FileDescriptor.in));
+        OutputStream proto = new BufferedOutputStream(new FileOutputStream(FileDescriptor.out));
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                public void checkPermission(java.security.Permission perm) {}
+                public void checkPermission(java.security.Permission perm, Object context) {}
+                public void checkExit(int status) { throw new ExitTrapped(status); }
+            });
+        } catch (Throwable t) {
+            // newer JVMs refuse a security manager; a compressor calling
+            // System.exit() then ends the daemon and the builder falls back
+            // to a one-shot java -jar run for that job
+        }
+        proto.write("READY\n".getBytes("UTF-8"));
+        proto.flush();
+
+        String jar;
+        while ((jar = readLine(in)) != null && jar.length() > 0) {
+            String[] args = new String[Integer.parseInt(readLine(in))];
+            for (int i = 0; i < args.length; i++)
+                args[i] = readLine(in);
+            byte[] input = new byte[Integer.parseInt(readLine(in))];
+            for (int n = 0, r; n < input.length; n += r) {
+                if ((r = in.read(input, n, input.length - n)) == -1)
+                    throw new EOFException();
+            }
+
+            ByteArrayOutputStream out = new ByteArrayOutputStream();
+            ByteArrayOutputStream err = new ByteArrayOutputStream();
+            PrintStream oldOut = System.out, oldErr = System.err;
+            InputStream oldIn = System.in;
+            System.setIn(new ByteArrayInputStream(input));
+            System.setOut(new PrintStream(out, true));
+            System.setErr(new PrintStream(err, true));
+            int status = 0;
+            try {
+                mainMethod(jar).invoke(null, new Object[] { args });
+            } catch (InvocationTargetException e) {
+                Throwable cause = e.getCause();
+                if (cause instanceof ExitTrapped) {
+                    status = ((ExitTrapped) cause).status;
+                } else {
+                    cause.printStackTrace();
+                    status = 1;
+                }
+            } catch (ExitTrapped e) {
+                status = e.status;
+            } catch (Throwable t) {
+                t.printStackTrace();
+                status = 1;
+            } finally {
+                System.out.flush();
+                System.err.flush();
+                System.setIn(oldIn);
+                System.setOut(oldOut);
+                System.setErr(oldErr);
+            }
+            byte[] o = out.toByteArray(), e = err.toByteArray();
+            proto.write((status + " " + o.length + " " + e.length + "\n").getBytes("UTF-8"));
+            proto.write(o);
+            proto.write(e);
+            proto.flush();
+        }
+    }
+}
+"""
+
+class DaemonError(Exception):
+    pass
+
+def _maxrss_bytes(maxrss):
+    if sys.platform == "darwin":
+        return maxrss
+    return maxrss * 1024    # KB everywhere else
+
+class JavaUsage(object):
+    """Resources used by one compressor run. user, sys (seconds) and
+    maxrss (bytes) are None when they cannot be measured here. For a
+    daemon run they are taken from /proc: the CPU time the JVM spent on
+    the job and its peak size so far."""
+
+    def __init__(self, daemon=False):
+        self.daemon = daemon
+        self.wall = None
+        self.user = None
+        self.sys = None
+        self.maxrss = None
+        self.status = None
+        self.timed_out = False
+
+    def as_dict(self):
+        return {"daemon": self.daemon, "wall": self.wall, "user": self.user, "sys": self.sys,
+                "maxrss": self.maxrss, "status": self.status, "timed_out": self.timed_out}
+
+    def __str__(self):
+        if self.timed_out:
+            return "java killed after %.0fs" % self.wall
+        parts = ["java %.2fs wall" % self.wall]
+        if self.user is not None:
+            parts.append("%.2fs user, %.2fs sys" % (self.user, self.sys))
+        if self.maxrss is not None:
+            parts.append("%dMB max RSS" % (self.maxrss >> 20))
+        if self.status:
+            parts.append("exit status %d" % self.status)
+        return ", ".join(parts)
+
+def _proc_usage(pid):
+    """(user, sys, peak rss) of a running process from /proc, Nones when
+    there is no /proc."""
+    try:
+        f = open("/proc/%d/stat" % pid)
+        try:
+            # the fields after the parenthesized command name
+            fields = f.read().rsplit(")", 1)[1].split()
+        finally:
+            f.close()
+        f = open("/proc/%d/status" % pid)
+        try:
+            status = f.read()
+        finally:
+            f.close()
+    except (IOError, OSError, IndexError):
+        return None, None, None
+    ticks = float(os.sysconf("SC_CLK_TCK"))
+    maxrss = None
+    for line in status.splitlines():
+        if line.startswith("VmHWM:"):
+            maxrss = int(line.split()[1]) * 1024
+    return int(fields[11]) / ticks, int(fields[12]) / ticks, maxrss
+
+# the JVMs run in a process group of their own, so that killing them also
+# gets whatever a wrapper script around java started
+_new_group = getattr(os, "setpgrp", None)
+
+def _kill(process):
+    try:
+        if _new_group is not None:
+            os.killpg(process.pid, signal.SIGKILL)
+        elif hasattr(process, "kill"):
+            process.kill()
+        else:
+            os.kill(process.pid, signal.SIGKILL)
+    except OSError:
+        # already gone
+        pass
+
+class _Timeout(object):
+    """Kills *process* unless cancelled within *timeout* seconds."""
+
+    def __init__(self, process, timeout):
+        self.expired = False
+        self.timer = None
+        if timeout:
+            self.timer = threading.Timer(timeout, self._expire, [process])
+            self.timer.setDaemon(True)
+            self.timer.start()
+
+    def _expire(self, process):
+        self.expired = True
+        _kill(process)
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+
+def _time_left(timeout, deadline):
+    """*timeout* cut down to the seconds left until *deadline*, a
+    time.time() value, but never to nothing."""
+    if deadline:
+        left = max(deadline - time.time(), 0.1)
+        if not timeout or left < timeout:
+            timeout = left
+    return timeout
+
+def _read_exactly(stream, size):
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            raise DaemonError("compressor daemon closed its output")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+class CompressorDaemon(object):
+    """A long-lived JVM running compressor jars on request.
+
+    Paths given to run() are resolved by the JVM, whose working directory
+    is fixed when the daemon starts, so pass absolute paths. Every job gets
+    the jar loaded afresh; *reuse_loaders* keeps one class loader per jar
+    instead, which lets compressor state leak from job to job and is only
+    there for benchmark.py to measure the difference.
+    """
+
+    def __init__(self, java_bin="java", javac_bin="javac", classdir=None, reuse_loaders=False):
+        self.java_bin = java_bin
+        self.javac_bin = javac_bin
+        self.reuse_loaders = reuse_loaders
+        if classdir is None:
+            classdir = os.path.join(tempfile.gettempdir(), "extjs-py-builder-%s" %
+                                    sha1(DAEMON_SOURCE).hexdigest()[:12])
+        self.classdir = classdir
+        self.process = None
+        self._lock = threading.Lock()
+
+    def _compile(self):
+        if os.path.isfile(os.path.join(self.classdir, DAEMON_CLASS + ".class")):
+            return
+        # compile in a private directory and move it into place, so that
+        # concurrent builders never see a half written class file
+        builddir = tempfile.mkdtemp(prefix="extjs-py-builder-")
+        source = os.path.join(builddir, DAEMON_CLASS + ".java")
+        f = open(source, "w")
+        f.write(DAEMON_SOURCE)
+        f.close()
+        try:
+            javac = subprocess.Popen([self.javac_bin, "-nowarn", "-d", builddir, source],
+                                     stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError, e:
+            shutil.rmtree(builddir, True)
+            raise DaemonError("cannot run %s: %s" % (self.javac_bin, e))
+        output = javac.communicate()[0]
+        if javac.returncode != 0:
+            shutil.rmtree(builddir, True)
+            raise DaemonError("compiling %s failed:\n%s" % (DAEMON_CLASS, output))
+        os.unlink(source)
+        try:
+            os.rename(builddir, self.classdir)
+        except OSError:
+            # somebody else won the race, use theirs
+            shutil.rmtree(builddir, True)
+            if not os.path.isfile(os.path.join(self.classdir, DAEMON_CLASS + ".class")):
+                raise DaemonError("cannot install %s into %s" % (DAEMON_CLASS, self.classdir))
+
+    def start(self, timeout=None):
+        if self.alive():
+            return
+        self._compile()
+        try:
+            self.process = subprocess.Popen([self.java_bin] +
+                                            (self.reuse_loaders and ["-Dcompressor.reuseLoaders=true"] or []) +
+                                            ["-cp", self.classdir, DAEMON_CLASS],
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            preexec_fn=_new_group)
+        except OSError, e:
+            raise DaemonError("cannot run %s: %s" % (self.java_bin, e))
+        timer = _Timeout(self.process, timeout)
+        ready = self.process.stdout.readline()
+        timer.cancel()
+        if ready != "READY\n":
+            self.stop()
+            if timer.expired:
+                raise DaemonError("compressor daemon did not start within %ss" % timeout)
+            raise DaemonError("compressor daemon did not start")
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, jar, args, timeout=None, usage=None, input=None, deadline=None):
+        """Run main() of *jar* with *args* and *input* as its stdin, return
+        (status, stdout, stderr). After *timeout* seconds, or at *deadline*,
+        the daemon is killed and DaemonError raised with *usage*, a
+        JavaUsage filled in as far as possible, marked as timed out. Jobs
+        run one at a time; the time waiting for the one before does not
+        count."""
+        input = input or ""
+        request = [os.path.abspath(jar), str(len(args))] + list(args) + [str(len(input))]
+        self._lock.acquire()
+        try:
+            if not self.alive():
+                raise DaemonError("compressor daemon is not running")
+            timeout = _time_left(timeout, deadline)
+            if usage is not None:
+                before = _proc_usage(self.process.pid)
+            timer = _Timeout(self.process, timeout)
+            try:
+                self.process.stdin.write("".join([line + "\n" for line in request]) + input)
+                self.process.stdin.flush()
+                header = self.process.stdout.readline().split()
+                if len(header) != 3:
+                    raise DaemonError("compressor daemon closed its output")
+                status, outlen, errlen = [int(x) for x in header]
+                out = _read_exactly(self.process.stdout, outlen)
+                err = _read_exactly(self.process.stdout, errlen)
+            except (IOError, OSError, ValueError, DaemonError), e:
+                timer.cancel()
+                if timer.expired:
+                    if usage is not None:
+                        usage.timed_out = True
+                    e = "killed after %ss" % timeout
+                # otherwise most likely a compressor called System.exit() on
+                # a JVM without a security manager; the daemon is gone either way
+                self.stop()
+                raise DaemonError(str(e))
+            timer.cancel()
+            if usage is not None and before[0] is not None:
+                after = _proc_usage(self.process.pid)
+                if after[0] is not None:
+                    usage.user = after[0] - before[0]
+                    usage.sys = after[1] - before[1]
+                    usage.maxrss = after[2]
+            return status, out, err
+        finally:
+            self._lock.release()
+
+    def stop(self):
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            if process.poll() is None:
+                process.stdin.write("\n")
+                process.stdin.close()
+            process.wait()
+        except (IOError, OSError):
+            pass
+
+_daemons = {}       # name -> CompressorDaemon
+_daemon_pid = None
+_daemon_failed = False
+_daemon_lock = threading.Lock()
+
+def get_daemon(java_bin="java", javac_bin="javac", timeout=None, name=None):
+    """Return the shared, running compressor daemon or None when it cannot
+    be started (within *timeout* seconds). Every *name* gets a daemon of
+    its own, so that runs under different names can go at the same time.
+    A failed start is not retried for the rest of the run. Forked worker
+    processes each get daemons of their own. Safe to call from several
+    threads."""
+    global _daemon_pid, _daemon_failed
+    _daemon_lock.acquire()
+    try:
+        if _daemon_failed:
+            return None
+        if _daemon_pid != os.getpid():
+            _daemons.clear()
+            _daemon_pid = os.getpid()
+        daemon = _daemons.get(name)
+        if daemon is None:
+            daemon = _daemons[name] = CompressorDaemon(java_bin, javac_bin or "javac")
+            atexit.register(daemon.stop)
+        try:
+            daemon.start(timeout)
+        except DaemonError, e:
+            print >>sys.stderr, "..compressor daemon unavailable (%s), using java -jar" % e
+            _daemon_failed = True
+            return None
+        return daemon
+    finally:
+        _daemon_lock.release()
+
+def _wait(process):
+    """process.wait() that also returns the rusage of the child, None
+    where there is no os.wait4()."""
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    while 1:
+        try:
+            pid, status, rusage = os.wait4(process.pid, 0)
+            break
+        except OSError, e:
+            if e.errno != errno.EINTR:
+                raise
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return process.returncode, rusage
+
+def _feed(stream, data):
+    try:
+        try:
+            stream.write(data)
+        finally:
+            stream.close()
+    except (IOError, OSError):
+        # it exited without reading all of it
+        pass
+
+def run_jar_once(java_bin, jar, args, timeout=None, usage=None, input=None, deadline=None):
+    """One-shot ``java -jar <jar> <args>``, returns (status, stdout data).
+    *input* is written to its stdin. The JVM is killed after *timeout*
+    seconds or at *deadline*. *usage* is a JavaUsage to fill in."""
+    timeout = _time_left(timeout, deadline)
+    try:
+        p = subprocess.Popen([java_bin, "-jar", jar] + list(args), stdout=subprocess.PIPE,
+                             stdin=input is not None and subprocess.PIPE or None,
+                             preexec_fn=_new_group)
+    except OSError, e:
+        print >>sys.stderr, "cannot run %s: %s" % (java_bin, e)
+        return 127, ""
+    if input is not None:
+        # from a thread, or both ends could wait on a full pipe
+        feeder = threading.Thread(target=_feed, args=(p.stdin, input))
+        feeder.setDaemon(True)
+        feeder.start()
+    timer = _Timeout(p, timeout)
+    try:
+        try:
+            out = p.stdout.read()
+            p.stdout.close()
+            status, rusage = _wait(p)
+        except KeyboardInterrupt:
+            # outside our process group, Ctrl-C did not reach it
+            _kill(p)
+            raise
+    finally:
+        timer.cancel()
+    if usage is not None:
+        usage.timed_out = timer.expired
+        if rusage is not None:
+            usage.user = rusage.ru_utime
+            usage.sys = rusage.ru_stime
+            usage.maxrss = _maxrss_bytes(rusage.ru_maxrss)
+    return status, out
+
+def _read_output(outfile, status, out):
+    """(status, output) of a run that wrote its output to *outfile*."""
+    if status != 0:
+        return status, ""
+    try:
+        f = open(outfile, "rb")
+    except IOError:
+        return 1, ""
+    try:
+        return status, f.read()
+    finally:
+        f.close()
+
+def run_jar_usage(java_bin, jar, args, javac_bin="javac", use_daemon=True, timeout=None, input=None,
+                  deadline=None, daemon_name=None, outfile=None):
+    """run_jar() that also returns the JavaUsage of the run. A run that
+    took longer than *timeout* seconds, or was not done by *deadline*, is
+    killed and returns a non-zero status; it is not retried. *daemon_name*
+    picks the daemon (see get_daemon())."""
+    if outfile is not None:
+        status, out, usage = run_jar_usage(java_bin, jar, args, javac_bin, use_daemon, timeout, input,
+                                           deadline, daemon_name)
+        return _read_output(outfile, status, out) + (usage,)
+    usage = JavaUsage()
+    started = time.time()
+    daemon = use_daemon and get_daemon(java_bin, javac_bin, _time_left(timeout, deadline),
+                                       daemon_name) or None
+    try:
+        if daemon is not None:
+            usage.daemon = True
+            try:
+                status, out, err = daemon.run(jar, args, timeout, usage, input, deadline)
+            except DaemonError:
+                if usage.timed_out:
+                    usage.status = status = -signal.SIGKILL
+                    return status, "", usage
+            else:
+                if err:
+                    sys.stderr.write(err)
+                usage.status = status
+                return status, out, usage
+            usage = JavaUsage()
+            started = time.time()
+        status, out = run_jar_once(java_bin, jar, args, timeout, usage, input, deadline)
+        usage.status = status
+        return status, out, usage
+    finally:
+        usage.wall = time.time() - started
+
+def run_jar(java_bin, jar, args, javac_bin="javac", use_daemon=True, timeout=None, input=None,
+            deadline=None, daemon_name=None, outfile=None):
+    """Run a compressor jar like ``java -jar <jar> <args>`` would, with
+    *input* (a string) as its stdin, and return (status, stdout data), or
+    the data it wrote to *outfile* for jars that only write files (YUI
+    Compressor with -o). Uses the shared daemon when possible."""
+    return run_jar_usage(java_bin, jar, args, javac_bin, use_daemon, timeout, input,
+                         deadline, daemon_name, outfile)[:2]
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+"""On-disk cache of minified output, shared between builds.
+
+Entries are keyed by the sha1 of the source text, the identity of the
+compressor (its name plus the checksum of its jar for the Java ones) and
+the compressor options, so an entry never has to be invalidated: a
+changed input, compressor or option simply makes a new key.
+"""
+
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+try:
+    import threading
+except ImportError:
+    import dummy_threading as threading
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".extjs-py-builder", "cache")
+MEMORY_LIMIT = 64 << 20   # bytes of entries kept in memory
+
+_jar_checksums = {}
+
+def file_checksum(fname):
+    f = open(fname, "rb")
+    try:
+        h = sha1()
+        while 1:
+            block = f.read(1 << 16)
+            if not block:
+                break
+            h.update(block)
+        return h.hexdigest()
+    finally:
+        f.close()
+
+def compressor_id(name, jar=None):
+    """Identity string for a compressor; includes the checksum of *jar*
+    when it can be found (it is run relative to the current directory)."""
+    if jar is None:
+        return name
+    path = os.path.abspath(jar)
+    if path not in _jar_checksums:
+        if os.path.isfile(path):
+            _jar_checksums[path] = file_checksum(path)
+        else:
+            _jar_checksums[path] = "unknown"
+    return "%s:%s" % (name, _jar_checksums[path])
+
+class MinifyCache(object):
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        # entries used in this process, saves the disk round trip when a
+        # long running build (--watch) asks for the same result again
+        self.memory = {}
+        self._memory_size = 0
+        # --auto runs compressors on several threads over one cache
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # the -ng build hands the cache to pool workers
+        state = self.__dict__.copy()
+        del state["_lock"], state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _count(self, hit):
+        self._lock.acquire()
+        try:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        finally:
+            self._lock.release()
+        if hit:
+            self._local.hits = self.thread_hits() + 1
+
+    def thread_hits(self):
+        """The hits so far of the calling thread, for telling whether a
+        minify() on it came from the cache while other threads use it too."""
+        return getattr(self._local, "hits", 0)
+
+    def key(self, data, compressor, options=()):
+        h = sha1(data)
+        h.update("\0%s\0%r" % (compressor, tuple(options)))
+        return h.hexdigest()
+
+    def key_chunks(self, chunks, compressor, options=()):
+        """key() of the data made of *chunks* joined."""
+        h = sha1()
+        for chunk in chunks:
+            h.update(chunk)
+        h.update("\0%s\0%r" % (compressor, tuple(options)))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        if key in self.memory:
+            self._count(True)
+            return self.memory[key]
+        try:
+            f = open(self._path(key), "rb")
+        except IOError:
+            self._count(False)
+            return None
+        try:
+            data = f.read()
+        finally:
+            f.close()
+        self._count(True)
+        self._remember(key, data)
+        return data
+
+    def _remember(self, key, data):
+        self._lock.acquire()
+        try:
+            if self._memory_size + len(data) > MEMORY_LIMIT:
+                self.memory.clear()
+                self._memory_size = 0
+            self.memory[key] = data
+            self._memory_size += len(data)
+        finally:
+            self._lock.release()
+
+    def put(self, key, data):
+        self._remember(key, data)
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        try:
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            # write aside and rename, concurrent builds may share the cache
+            fd, tmpname = tempfile.mkstemp(dir=dirname)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            os.rename(tmpname, path)
+        except (IOError, OSError):
+            # a cache that cannot be written only costs speed
+            pass
+
+    def get_file(self, key):
+        """Like get(), but returns the entry as an open file."""
+        if key in self.memory:
+            self._count(True)
+            return StringIO(self.memory[key])
+        try:
+            f = open(self._path(key), "rb")
+        except IOError:
+            self._count(False)
+            return None
+        self._count(True)
+        return f
+
+    def put_file(self, key, fname):
+        """Like put(), with the data in the file *fname*."""
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        try:
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            fd, tmpname = tempfile.mkstemp(dir=dirname)
+            os.close(fd)
+            shutil.copyfile(fname, tmpname)
+            os.rename(tmpname, path)
+        except (IOError, OSError):
+            pass
+
+    def minify_chunks(self, chunks, dst, compressor, options, func):
+        """minify() for data made of *chunks*, a list of strings, written
+        to the file *dst* without being held in memory as a whole: *func* is
+        called as func(chunks, outfile) with an open file and raises on
+        failure, in which case *dst* is left alone."""
+        key = self.key_chunks(chunks, compressor, options)
+        tmpname = dst + ".tmp"
+        outf = open(tmpname, "wb")
+        cached = self.get_file(key)
+        try:
+            try:
+                if cached is not None:
+                    shutil.copyfileobj(cached, outf)
+                else:
+                    func(chunks, outf)
+            finally:
+                outf.close()
+                if cached is not None:
+                    cached.close()
+            if cached is None:
+                self.put_file(key, tmpname)
+            if os.path.exists(dst) and os.name == "nt":
+                os.unlink(dst)
+            os.rename(tmpname, dst)
+        except:
+            os.unlink(tmpname)
+            raise
+
+    def minify(self, data, compressor, options, func):
+        """Return func(data), from the cache when this compressor already
+        processed the same data with the same options. *func* may return
+        None to signal failure, which is not cached."""
+        key = self.key(data, compressor, options)
+        result = self.get(key)
+        if result is None:
+            result = func(data)
+            if result is not None:
+                self.put(key, result)
+        return result
+
+    def summary(self):
+        return "minify cache: %d hits, %d misses" % (self.hits, self.misses)
+
+class NoCache(MinifyCache):
+    """Stand-in used with --no-cache, always runs the compressor."""
+
+    def __init__(self):
+        MinifyCache.__init__(self, None)
+
+    def get(self, key):
+        self._count(False)
+        return None
+
+    def put(self, key, data):
+        pass
+
+    def key_chunks(self, chunks, compressor, options=()):
+        return None
+
+    def get_file(self, key):
+        self._count(False)
+        return None
+
+    def put_file(self, key, fname):
+        pass
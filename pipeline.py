@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""Compressor pipelines over in-memory buffers.
+
+A stage is a callable taking the data and returning it compressed, or
+None when it failed. A Pipeline runs its stages one after the other on
+the output of the one before, so a target goes from its sources to its
+final output without intermediate files, and is written once. A stage
+that fails passes its input on to the next one.
+
+Stages are named; a target's stages can be given in its .jsb file as
+compress="shrinksafe,jsmin" (see parse_stages()).
+"""
+
+# in the order the compressor options run them
+STAGES = ["shrinksafe", "yui_compressor", "jsmin", "jspacker", "cssmin"]
+# the ones for each kind of target
+JS_STAGES = ["shrinksafe", "yui_compressor", "jsmin", "jspacker"]
+CSS_STAGES = ["yui_compressor", "cssmin"]
+
+def parse_stages(spec, stages=STAGES):
+    """The stage names in a compress attribute, comma or space separated;
+    raises ValueError on an unknown one or one not in *stages*, those that
+    work on the target."""
+    names = spec.replace(",", " ").split()
+    for name in names:
+        if name not in STAGES:
+            raise ValueError("unknown compressor %r, use %s" % (name, ", ".join(stages)))
+        if name not in stages:
+            raise ValueError("%s does not work on this target, use %s" % (name, ", ".join(stages)))
+    return names
+
+class Pipeline(object):
+    """Runs [(name, stage)] in order. *before(name)* and *after(name, error)*
+    are called around every stage, error being None when it worked."""
+
+    def __init__(self, stages, before=None, after=None):
+        self.stages = stages
+        self.before = before
+        self.after = after
+
+    def names(self):
+        return [name for name, stage in self.stages]
+
+    def run(self, data):
+        """Returns the output of the last stage and the names of those
+        that failed."""
+        failed = []
+        for name, stage in self.stages:
+            if self.before is not None:
+                self.before(name)
+            try:
+                result = stage(data)
+            except Exception, e:
+                error = e
+            else:
+                error = result is None and "failed" or None
+            if error is None:
+                data = result
+            else:
+                failed.append(name)
+            if self.after is not None:
+                self.after(name, error)
+        return data, failed
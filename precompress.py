@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+"""Precompressed copies of the build outputs, for web servers that send
+<file>.gz as is (nginx gzip_static, Apache MultiViews).
+
+Outputs are gzipped at the maximum level on a pool of worker threads while
+the build goes on; zlib and sha1 let go of the interpreter lock while they
+work, so this overlaps the compressor passes. A .gz file is only written
+again when the content it was made from changed.
+"""
+
+import os
+import time
+import zlib
+import struct
+import threading
+import Queue
+from minifycache import file_checksum
+
+GZIP_LEVEL = 9
+BLOCK_SIZE = 1 << 16
+
+def gzip_size(data, level=GZIP_LEVEL):
+    """Size of *data* after gzip_file()."""
+    # a gzip header and trailer are 18 bytes, zlib's 6
+    return len(zlib.compress(data, level)) + 12
+
+def gzip_file(fname, gzname=None, level=GZIP_LEVEL):
+    """Writes *fname* gzipped to *gzname*, <fname>.gz by default, and
+    returns the size of the result."""
+    if gzname is None:
+        gzname = fname + ".gz"
+    tmpname = gzname + ".tmp"
+    inf = open(fname, "rb")
+    try:
+        outf = open(tmpname, "wb")
+        try:
+            try:
+                mtime = int(os.fstat(inf.fileno()).st_mtime) & 0xffffffff
+                # magic, deflate, no flags, mtime, maximum compression, unknown OS
+                outf.write("\x1f\x8b\x08\x00" + struct.pack("<I", mtime) + "\x02\xff")
+                compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+                crc = zlib.crc32("")
+                size = 0
+                while 1:
+                    block = inf.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    crc = zlib.crc32(block, crc)
+                    size += len(block)
+                    outf.write(compressor.compress(block))
+                outf.write(compressor.flush())
+                outf.write(struct.pack("<II", crc & 0xffffffff, size & 0xffffffff))
+            finally:
+                outf.close()
+        except:
+            os.unlink(tmpname)
+            raise
+    finally:
+        inf.close()
+    if os.path.exists(gzname) and os.name == "nt":
+        os.unlink(gzname)
+    os.rename(tmpname, gzname)
+    return os.path.getsize(gzname)
+
+class Precompressor(object):
+    """Writes <output>.gz for the outputs submitted, on *workers* threads
+    (0 does it in submit()). *hashes* maps an output to the sha1 of the
+    content its .gz was made from and is kept up to date."""
+
+    def __init__(self, hashes, workers=2):
+        self.hashes = hashes
+        self.workers = workers
+        # (output, wall time, size, size of the .gz or None when skipped)
+        self.results = []
+        self.errors = []    # (output, exception)
+        self._queue = Queue.Queue()
+        self._threads = []
+
+    def needed(self, fname):
+        """Quick test for outputs that were not rebuilt: False when there
+        is a .gz made from a known content. submit() looks closer."""
+        return fname not in self.hashes or not os.path.isfile(fname + ".gz")
+
+    def submit(self, fname):
+        if self.workers < 1:
+            self._run(fname)
+            return
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                thread.start()
+                self._threads.append(thread)
+        self._queue.put(fname)
+
+    def _work(self):
+        while 1:
+            fname = self._queue.get()
+            if fname is None:
+                break
+            self._run(fname)
+
+    def _run(self, fname):
+        try:
+            self.results.append(self.precompress(fname))
+        except (IOError, OSError), e:
+            self.errors.append((fname, e))
+
+    def precompress(self, fname):
+        started = time.time()
+        checksum = file_checksum(fname)
+        size = os.path.getsize(fname)
+        gzname = fname + ".gz"
+        if self.hashes.get(fname) == checksum and os.path.isfile(gzname):
+            return fname, time.time() - started, size, None
+        gzsize = gzip_file(fname, gzname)
+        self.hashes[fname] = checksum
+        return fname, time.time() - started, size, gzsize
+
+    def join(self):
+        """Waits for the submitted outputs to be done."""
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
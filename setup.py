@@ -9,6 +9,6 @@ setup(
     description='Build ExtJS codebase and create a packaged build (concatenated, compressed, etc).',
     author='Bas van Oostveen',
     author_email='v.oostveen@gmail.com',
-    py_modules=['build_ext_packages'],
+    py_modules=['build_ext_packages', 'jvmcompressor', 'minifycache', 'buildmanifest', 'jsbwatch', 'fastjsmin', 'buildstats', 'precompress', 'cssmin', 'datauri', 'jspackages', 'treeshake', 'pipeline'],
 )
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+"""Custom subsets of ext-all.js holding what an application uses.
+
+The class index records for every source file what it defines and refers
+to (jspackages.scan()), the xtypes it registers with Ext.reg() and uses,
+and the classes it changes with Ext.override() or by assigning to their
+prototype. It is kept in a JSON file between builds, and a file is only
+scanned again when its mtime or size changed.
+
+shake() starts from the names and xtypes the application code uses and
+adds the files defining them, then everything those files use, until
+nothing new turns up. References are followed whatever their place in the
+include list, since the ones to later files are used at run time; the
+subset keeps the include order. Files changing a class that is in are in
+too, or the class would behave differently than in ext-all.js.
+"""
+
+import os
+import re
+try:
+    import json
+except ImportError:
+    import simplejson as json
+from jspackages import scan
+
+INDEX_VERSION = 1
+
+_REGISTER = re.compile(r"""\bExt\.reg\(\s*["']([\w.-]+)["']\s*,\s*([\w$.]+)""")
+# xtype: 'grid', defaultType: 'panel'
+_XTYPE = re.compile(r"""\b(?:xtype|defaultType)\s*:\s*["']([\w.-]+)["']""")
+_OVERRIDE = re.compile(r"\bExt\.override\(\s*([\w$.]+)")
+
+def scan_classes(source):
+    """Everything the class index keeps about *source*, as a dict of
+    lists (and a dict of the xtypes registered)."""
+    defines, references = scan(source)
+    overrides = set(_OVERRIDE.findall(source))
+    for name in defines:
+        if ".prototype" in name:
+            overrides.add(name[:name.index(".prototype")])
+    return {
+        "defines": sorted(defines),
+        "references": sorted(references),
+        "registers": dict(_REGISTER.findall(source)),
+        "xtypes": sorted(set(_XTYPE.findall(source))),
+        "overrides": sorted(overrides),
+    }
+
+class ClassIndex(object):
+    """scan_classes() of the source files, kept in *fname*."""
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.files = {}     # source file -> {"state": [mtime, size], ...}
+        self.scanned = 0    # files scanned in this run
+        self._dirty = False
+        try:
+            f = open(fname)
+        except IOError:
+            return
+        try:
+            try:
+                data = json.load(f)
+            except ValueError:
+                return
+        finally:
+            f.close()
+        if data.get("version") == INDEX_VERSION:
+            self.files = data.get("files", {})
+
+    def get(self, fname):
+        """The entry of *fname*, scanned again when it changed."""
+        st = os.stat(fname)
+        state = [st.st_mtime, st.st_size]
+        entry = self.files.get(fname)
+        if entry is None or entry["state"] != state:
+            f = open(fname)
+            try:
+                entry = scan_classes(f.read())
+            finally:
+                f.close()
+            entry["state"] = state
+            self.files[fname] = entry
+            self.scanned += 1
+            self._dirty = True
+        return entry
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmpname = self.fname + ".tmp"
+        f = open(tmpname, "w")
+        try:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, f, sort_keys=True)
+        finally:
+            f.close()
+        if os.path.exists(self.fname) and os.name == "nt":
+            os.unlink(self.fname)
+        os.rename(tmpname, self.fname)
+        self._dirty = False
+
+def app_files(paths):
+    """The .js files of the application: *paths* are files or directories
+    searched for them."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(".js"):
+                        files.append(os.path.join(dirpath, filename))
+        else:
+            files.append(path)
+    return files
+
+def shake(files, index, app):
+    """The *files* of ext-all.js, in include order, that the application
+    files *app* need. *index* is the ClassIndex of both."""
+    entries = dict([(fname, index.get(fname)) for fname in files])
+    defined = {}    # name -> first file defining it
+    changed = {}    # class -> files overriding it
+    classes = {}    # xtype -> class
+    for fname in files:
+        entry = entries[fname]
+        for name in entry["defines"]:
+            defined.setdefault(name, fname)
+        for name in entry["overrides"]:
+            changed.setdefault(name, []).append(fname)
+        for xtype, name in entry["registers"].items():
+            classes.setdefault(xtype, name)
+    needed = set()
+    pending = []
+    def reach(entry):
+        names = entry["references"] + [classes[xtype] for xtype in entry["xtypes"] if xtype in classes]
+        for name in names:
+            parts = name.split(".")
+            for i in range(len(parts), 0, -1):
+                prefix = ".".join(parts[:i])
+                if prefix in defined:
+                    for fname in [defined[prefix]] + changed.get(prefix, []):
+                        if fname not in needed:
+                            needed.add(fname)
+                            pending.append(fname)
+                    break
+    for fname in app:
+        reach(index.get(fname))
+    while pending:
+        reach(entries[pending.pop()])
+    return [fname for fname in files if fname in needed]